@@ -9,6 +9,9 @@ pages = {
         st.Page("pages/doctrine_status.py", title="⚔️Doctrine Status"),
         st.Page("pages/doctrine_report.py", title="📝Doctrine Report"),
         st.Page("pages/build_costs.py", title="🏗️Build Costs")
+    ],
+    "Admin": [
+        st.Page("pages/sync_history.py", title="🔄Sync History"),
     ]
 }
 pg = st.navigation(pages)
@@ -0,0 +1,97 @@
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from build_cost_models import BuildCostResult
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+build_cost_url = "sqlite:///build_cost.db"
+
+result_fields = [
+    "total_cost",
+    "total_cost_per_unit",
+    "total_material_cost",
+    "facility_tax",
+    "scc_surcharge",
+    "system_cost_index",
+    "total_job_cost",
+]
+
+_engine = None
+
+
+def get_cache_engine():
+    """Shared engine for the cache table, created with the table on first use."""
+    global _engine
+    if _engine is None:
+        _engine = sa.create_engine(build_cost_url)
+        BuildCostResult.__table__.create(_engine, checkfirst=True)
+    return _engine
+
+
+def get_cached_costs(product_id: int, runs: int, me: int, te: int, index_version: str, structures) -> dict:
+    """Get cached results for the given job, keyed by structure name.
+
+    structures is a sequence of rows with structure, structure_id and tax; a
+    cached entry is only used if the structure's tax is unchanged.
+    """
+    taxes = {s.structure_id: s.tax for s in structures}
+    names = {s.structure_id: s.structure for s in structures}
+
+    stmt = sa.select(BuildCostResult).where(
+        BuildCostResult.product_id == product_id,
+        BuildCostResult.runs == runs,
+        BuildCostResult.me == me,
+        BuildCostResult.te == te,
+        BuildCostResult.index_version == index_version,
+    )
+    results = {}
+    with Session(get_cache_engine()) as session:
+        for row in session.scalars(stmt):
+            if row.structure_id in names and row.tax == taxes[row.structure_id]:
+                results[names[row.structure_id]] = {field: getattr(row, field) for field in result_fields}
+    return results
+
+
+def store_costs(product_id: int, runs: int, me: int, te: int, index_version: str, structures, results: dict):
+    """Store results (keyed by structure name) for the given job."""
+    created_at = datetime.datetime.now().astimezone(datetime.UTC).isoformat()
+    records = []
+    for structure in structures:
+        if structure.structure not in results:
+            continue
+        record = {
+            "product_id": product_id,
+            "runs": runs,
+            "me": me,
+            "te": te,
+            "structure_id": structure.structure_id,
+            "index_version": index_version,
+            "tax": structure.tax,
+            "created_at": created_at,
+        }
+        record.update({field: results[structure.structure][field] for field in result_fields})
+        records.append(record)
+
+    if not records:
+        return
+    stmt = insert(BuildCostResult).prefix_with("OR REPLACE")
+    with get_cache_engine().begin() as conn:
+        conn.execute(stmt, records)
+    logger.info(f"Cached {len(records)} build cost results for {product_id} (index version {index_version})")
+
+
+def purge_stale_costs(index_version: str):
+    """Delete cached results computed against any other industry index version."""
+    with get_cache_engine().begin() as conn:
+        res = conn.execute(sa.delete(BuildCostResult).where(BuildCostResult.index_version != index_version))
+    if res.rowcount:
+        logger.info(f"Purged {res.rowcount} cached build cost results for old industry indexes")
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,367 @@
+import re
+import datetime
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import requests
+import sqlalchemy as sa
+
+from build_cost_models import MarketPrice
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+build_cost_url = "sqlite:///build_cost.db"
+sde_url = "sqlite:///sde.db"
+blueprint_products_file = "industryActivityProducts.csv"
+
+esi_prices_url = "https://esi.evetech.net/latest/markets/prices/?datasource=tranquility"
+esi_headers = {
+    "Accept": "application/json",
+    "User-Agent": "WC Markets v0.52 (admin contact: Orthel.Toralen@gmail.com; +https://github.com/OrthelT/wcmkts_new"
+}
+
+# ESI refreshes adjusted/average prices about once a day; re-check hourly
+market_price_ttl = datetime.timedelta(hours=1)
+_market_price_lock = threading.Lock()
+
+MANUFACTURING_ACTIVITY = 1
+SCC_SURCHARGE_RATE = 0.04
+valid_structures = [35827, 35825, 35826]
+
+# (material reduction, job cost reduction) for engineering complexes
+STRUCTURE_ROLE_BONUSES = {
+    35825: (0.01, 0.03),  # Raitaru
+    35826: (0.01, 0.04),  # Azbel
+    35827: (0.01, 0.05),  # Sotiyo
+}
+
+SECURITY_MULTIPLIERS = {"HIGH_SEC": 1.0, "LOW_SEC": 1.9, "NULL_SEC": 2.1}
+RIG_ME_BONUSES = {"I": 0.02, "II": 0.024}
+
+SHIP_GROUPS = {
+    "basic_small_ship": {25, 31, 237, 420},
+    "advanced_small_ship": {324, 541, 830, 831, 834, 893, 1022, 1283, 1305, 1527, 1534},
+    "basic_medium_ship": {26, 28, 419, 463, 1201},
+    "advanced_medium_ship": {358, 380, 540, 543, 832, 833, 894, 906, 963, 1202, 1972},
+    "basic_large_ship": {27, 513, 941},
+    "advanced_large_ship": {898, 900, 902},
+    "capital_ship": {30, 485, 547, 659, 883, 1538, 4594},
+}
+COMPONENT_GROUPS = {
+    "advanced_component": {334, 913, 964},
+    "basic_capital_component": {873},
+    "structure": {1136},  # fuel blocks are built with structure rigs
+}
+CATEGORY_CLASSES = {
+    7: "equipment",
+    20: "equipment",
+    22: "equipment",
+    8: "ammunition",
+    18: "drone_fighter",
+    87: "drone_fighter",
+    23: "structure",
+    65: "structure",
+    66: "structure",
+}
+
+all_ships = set(SHIP_GROUPS)
+
+# rig target (as named in the rig type name) -> product classes it applies to
+RIG_TARGETS = {
+    "Equipment": {"equipment"},
+    "Ammunition": {"ammunition"},
+    "Drone and Fighter": {"drone_fighter"},
+    "Basic Small Ship": {"basic_small_ship"},
+    "Basic Medium Ship": {"basic_medium_ship"},
+    "Basic Large Ship": {"basic_large_ship"},
+    "Advanced Small Ship": {"advanced_small_ship"},
+    "Advanced Medium Ship": {"advanced_medium_ship"},
+    "Advanced Large Ship": {"advanced_large_ship"},
+    "Capital Ship": {"capital_ship"},
+    "Advanced Component": {"advanced_component"},
+    "Basic Capital Component": {"basic_capital_component"},
+    "Structure": {"structure"},
+    "Equipment and Consumable": {"equipment", "ammunition", "drone_fighter"},
+    "Ship": all_ships,
+    "Structure and Component": {"structure", "advanced_component", "basic_capital_component"},
+}
+
+rig_pattern = re.compile(r"^Standup (?:M|L|XL)-Set (.+) Manufacturing (Material |Time )?Efficiency (I{1,2})$")
+
+result_columns = [
+    "total_cost",
+    "total_cost_per_unit",
+    "total_material_cost",
+    "facility_tax",
+    "scc_surcharge",
+    "system_cost_index",
+    "total_job_cost",
+]
+
+
+def parse_rig(rig_name: str | None) -> tuple[set, float]:
+    """Return the product classes a rig applies to and its base material bonus."""
+    if rig_name is None or rig_name == "0":
+        return set(), 0.0
+    match = rig_pattern.match(rig_name)
+    if not match:
+        return set(), 0.0
+    target, efficiency, grade = match.groups()
+    if efficiency == "Time ":
+        return set(), 0.0
+    return RIG_TARGETS.get(target, set()), RIG_ME_BONUSES[grade]
+
+
+def classify_product(group_id: int, category_id: int) -> str | None:
+    """Map a product to the rig class used for material bonuses."""
+    for product_class, groups in SHIP_GROUPS.items():
+        if group_id in groups:
+            return product_class
+    for product_class, groups in COMPONENT_GROUPS.items():
+        if group_id in groups:
+            return product_class
+    return CATEGORY_CLASSES.get(category_id)
+
+
+@lru_cache(maxsize=1)
+def load_blueprints() -> dict[int, tuple[int, int]]:
+    """Blueprint type id and units per run for every manufactured product, read from the CSV once."""
+    df = pd.read_csv(blueprint_products_file)
+    df = df[df['activityID'] == MANUFACTURING_ACTIVITY].drop_duplicates('productTypeID')
+    return {int(product): (int(blueprint), int(quantity)) for product, blueprint, quantity in zip(df['productTypeID'], df['typeID'], df['quantity'])}
+
+
+@lru_cache(maxsize=1)
+def get_sde_engine() -> sa.Engine:
+    return sa.create_engine(sde_url)
+
+
+def get_blueprint(product_id: int) -> tuple[int, int]:
+    """Get the blueprint type id and units produced per run for a product."""
+    blueprint = load_blueprints().get(product_id)
+    if blueprint is None:
+        raise Exception(f"No blueprint found for {product_id}")
+    return blueprint
+
+
+def get_blueprint_materials(blueprint_id: int) -> pd.DataFrame:
+    """Get the base material quantities for one manufacturing run of a blueprint."""
+    engine = get_sde_engine()
+    query = sa.text("""
+        SELECT materialTypeID AS type_id, quantity
+        FROM industryActivityMaterials
+        WHERE typeID = :blueprint_id AND activityID = :activity_id
+    """)
+    with engine.connect() as conn:
+        df = pd.read_sql_query(query, conn, params={"blueprint_id": blueprint_id, "activity_id": MANUFACTURING_ACTIVITY})
+    if df.empty:
+        raise Exception(f"No materials found for blueprint {blueprint_id}")
+    return df
+
+
+def get_product_class(product_id: int) -> str | None:
+    engine = get_sde_engine()
+    query = sa.text("""
+        SELECT it.groupID, ig.categoryID
+        FROM invTypes it
+        JOIN invGroups ig ON it.groupID = ig.groupID
+        WHERE it.typeID = :type_id
+    """)
+    with engine.connect() as conn:
+        row = conn.execute(query, {"type_id": product_id}).fetchone()
+    if row is None:
+        return None
+    return classify_product(int(row[0]), int(row[1]))
+
+
+def _ensure_market_price_table(conn):
+    inspector = sa.inspect(conn)
+    if inspector.has_table(MarketPrice.__tablename__):
+        columns = {column["name"] for column in inspector.get_columns(MarketPrice.__tablename__)}
+        if "fetched_at" not in columns:
+            # older versions wrote the table with to_sql, without a primary key or fetch time
+            logger.info("Recreating market_prices with a primary key")
+            MarketPrice.__table__.drop(conn)
+    MarketPrice.__table__.create(conn, checkfirst=True)
+
+
+def fetch_market_prices() -> pd.DataFrame:
+    """Fetch ESI adjusted and average prices and store them in build_cost.db."""
+    response = requests.get(esi_prices_url, headers=esi_headers, timeout=30)
+    if response.status_code != 200:
+        logger.error(f"Error fetching market prices: {response.status_code}")
+        raise Exception(f"Error fetching market prices: {response.status_code}")
+
+    df = pd.DataFrame(response.json(), columns=["type_id", "adjusted_price", "average_price"])
+    fetched_at = datetime.datetime.now().astimezone(datetime.UTC)
+    rows = df.astype(object).where(df.notna(), None).assign(fetched_at=fetched_at.isoformat()).to_dict("records")
+    engine = sa.create_engine(build_cost_url)
+    with engine.begin() as conn:
+        _ensure_market_price_table(conn)
+        conn.execute(sa.delete(MarketPrice.__table__))
+        if rows:
+            conn.execute(sa.insert(MarketPrice.__table__), rows)
+    logger.info(f"Market prices updated at {fetched_at}: {len(df)} types")
+    return df
+
+
+def market_prices_fetched_at(engine: sa.Engine) -> datetime.datetime | None:
+    with engine.begin() as conn:
+        _ensure_market_price_table(conn)
+        fetched_at = conn.execute(sa.select(sa.func.max(MarketPrice.fetched_at))).scalar()
+    return datetime.datetime.fromisoformat(fetched_at) if fetched_at else None
+
+
+def refresh_market_prices(engine: sa.Engine, ttl: datetime.timedelta = market_price_ttl) -> bool:
+    """Fetch prices if the stored ones are older than ttl; returns True if they were refreshed.
+
+    A failed refresh keeps the stored prices when there are any.
+    """
+    with _market_price_lock:
+        fetched_at = market_prices_fetched_at(engine)
+        if fetched_at is not None and fetched_at + ttl > datetime.datetime.now().astimezone(datetime.UTC):
+            return False
+        logger.info(f"Market prices {'expired' if fetched_at else 'missing'}, fetching from ESI")
+        try:
+            fetch_market_prices()
+        except Exception as e:
+            if fetched_at is None:
+                raise
+            logger.error(f"Keeping market prices from {fetched_at}: {e}")
+            return False
+        return True
+
+
+def get_market_prices(type_ids: list[int]) -> pd.DataFrame:
+    """Get adjusted/average prices for type_ids, refreshing them from ESI once they are older than market_price_ttl."""
+    engine = sa.create_engine(build_cost_url)
+    refresh_market_prices(engine)
+
+    query = sa.select(MarketPrice.type_id, MarketPrice.adjusted_price, MarketPrice.average_price).where(
+        MarketPrice.type_id.in_([int(t) for t in type_ids]))
+    with engine.connect() as conn:
+        df = pd.read_sql_query(query, conn)
+    df = df.set_index("type_id").reindex(type_ids)
+    df["average_price"] = df["average_price"].fillna(df["adjusted_price"])
+    return df.fillna(0.0)
+
+
+def get_structure_inputs() -> pd.DataFrame:
+    """Get all manufacturing structures with their system manufacturing cost index."""
+    engine = sa.create_engine(build_cost_url)
+    query = sa.text("""
+        SELECT s.structure, s.structure_type_id, s.system_id, s.tax, s.rig_1, s.rig_2, s.rig_3,
+               ii.manufacturing
+        FROM structures s
+        LEFT JOIN industry_index ii ON ii.solar_system_id = s.system_id
+        WHERE s.structure_type_id IN :structure_type_ids
+    """).bindparams(sa.bindparam("structure_type_ids", expanding=True))
+    with engine.connect() as conn:
+        df = pd.read_sql_query(query, conn, params={"structure_type_ids": valid_structures})
+    return df
+
+
+def material_multipliers(structures: pd.DataFrame, product_class: str | None, security: str) -> np.ndarray:
+    """Combined structure and rig material multiplier for each structure."""
+    security_multiplier = SECURITY_MULTIPLIERS[security]
+    role_bonus = structures["structure_type_id"].map(lambda x: STRUCTURE_ROLE_BONUSES.get(x, (0.0, 0.0))[0]).to_numpy(dtype=float)
+    multipliers = 1.0 - role_bonus
+
+    rig_cache = {}
+    for col in ["rig_1", "rig_2", "rig_3"]:
+        rig_bonus = np.empty(len(structures))
+        for i, rig in enumerate(structures[col]):
+            if rig not in rig_cache:
+                classes, bonus = parse_rig(rig)
+                rig_cache[rig] = bonus * security_multiplier if product_class in classes else 0.0
+            rig_bonus[i] = rig_cache[rig]
+        multipliers *= 1.0 - rig_bonus
+    return multipliers
+
+
+def calculate_costs(
+    product_id: int,
+    runs: int,
+    me: int,
+    structures: pd.DataFrame,
+    security: str = "NULL_SEC",
+    system_cost_bonus: float = 0.0,
+) -> pd.DataFrame:
+    """Calculate manufacturing costs for a product at every structure in one vectorized pass.
+
+    Returns a frame indexed by structure name with the same fields as the everef
+    industry cost API (see pages/build_costs.get_costs).
+    """
+    blueprint_id, units_per_run = get_blueprint(product_id)
+    materials = get_blueprint_materials(blueprint_id)
+    prices = get_market_prices(materials["type_id"].tolist())
+    product_class = get_product_class(product_id)
+
+    base = materials["quantity"].to_numpy(dtype=float)
+    adjusted = prices["adjusted_price"].to_numpy(dtype=float)
+    average = prices["average_price"].to_numpy(dtype=float)
+
+    # material quantities per structure: (structures x materials)
+    multipliers = material_multipliers(structures, product_class, security)
+    raw = runs * base[None, :] * (1 - me / 100) * multipliers[:, None]
+    quantities = np.maximum(runs, np.ceil(np.round(raw, 2)))
+    quantities[:, base == 0] = 0
+    material_cost = quantities @ average
+
+    # estimated item value uses base quantities and adjusted prices
+    eiv = runs * float(base @ adjusted)
+    cost_index = structures["manufacturing"].fillna(0.0).to_numpy(dtype=float)
+    job_bonus = structures["structure_type_id"].map(lambda x: STRUCTURE_ROLE_BONUSES.get(x, (0.0, 0.0))[1]).to_numpy(dtype=float)
+    tax = structures["tax"].fillna(0.0).to_numpy(dtype=float)
+
+    system_cost = eiv * cost_index * (1 - job_bonus) * (1 + system_cost_bonus)
+    facility_tax = eiv * tax
+    scc_surcharge = np.full(len(structures), eiv * SCC_SURCHARGE_RATE)
+    total_job_cost = system_cost + facility_tax + scc_surcharge
+    total_cost = material_cost + total_job_cost
+
+    df = pd.DataFrame({
+        "total_cost": total_cost,
+        "total_cost_per_unit": total_cost / (runs * units_per_run),
+        "total_material_cost": material_cost,
+        "facility_tax": facility_tax,
+        "scc_surcharge": scc_surcharge,
+        "system_cost_index": system_cost,
+        "total_job_cost": total_job_cost,
+    }, index=structures["structure"].to_numpy())
+    return df[result_columns]
+
+
+def get_local_costs(product_id: int, runs: int, me: int, security: str = "NULL_SEC", system_cost_bonus: float = 0.0, structures: pd.DataFrame | None = None) -> dict:
+    """Local equivalent of get_costs: results keyed by structure name."""
+    if structures is None:
+        structures = get_structure_inputs()
+    df = calculate_costs(product_id, runs, me, structures, security, system_cost_bonus)
+    return df.to_dict(orient="index")
+
+
+def validate_against_everef(local_results: dict, everef_results: dict, tolerance: float = 0.01) -> pd.DataFrame:
+    """Compare local results to recorded everef results; returns relative error per structure and field."""
+    structures = [s for s in everef_results if s in local_results]
+    if not structures:
+        return pd.DataFrame(columns=result_columns)
+
+    local_df = pd.DataFrame.from_dict(local_results, orient="index").loc[structures, result_columns]
+    everef_df = pd.DataFrame.from_dict(everef_results, orient="index").loc[structures, result_columns]
+    errors = (local_df - everef_df).abs() / everef_df.abs().replace(0, np.nan)
+    errors = errors.fillna(0.0)
+
+    max_error = errors.to_numpy().max()
+    if max_error > tolerance:
+        worst = errors.max().idxmax()
+        logger.warning(f"Local cost engine differs from everef by up to {max_error:.2%} ({worst})")
+    else:
+        logger.info(f"Local cost engine within {tolerance:.0%} of everef for {len(structures)} structures")
+    return errors
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,117 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+import streamlit as st
+
+from build_cost_models import Structure
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+build_cost_url = "sqlite:///build_cost.db"
+valid_structures = [35827, 35825, 35826]
+invalid_rigs = [46640, 46641, 46496, 46497, 46634]
+everef_cost_url = "https://api.everef.net/v1/industry/cost"
+
+
+@dataclass
+class BuildCostCatalog:
+    """Structures, valid rigs and cost indexes for one industry index version.
+
+    Arrays are aligned with structures, so everything needed to price a job at
+    every structure is available without touching the database.
+    """
+    index_version: str
+    structures: list
+    rig_ids: dict[str, int]
+    cost_indexes: dict[int, float]
+    structure_type_ids: np.ndarray = field(init=False)
+    system_ids: np.ndarray = field(init=False)
+    taxes: np.ndarray = field(init=False)
+    manufacturing: np.ndarray = field(init=False)
+    structure_rig_ids: list[tuple[int, ...]] = field(init=False)
+    signatures: list[tuple] = field(init=False)
+    by_name: dict = field(init=False)
+
+    def __post_init__(self):
+        self.structure_type_ids = np.array([s.structure_type_id for s in self.structures], dtype=np.int64)
+        self.system_ids = np.array([s.system_id for s in self.structures], dtype=np.int64)
+        self.taxes = np.array([s.tax or 0.0 for s in self.structures], dtype=float)
+        self.manufacturing = np.array([self.cost_indexes.get(s.system_id, np.nan) for s in self.structures], dtype=float)
+        self.structure_rig_ids = [
+            tuple(self.rig_ids[rig] for rig in (s.rig_1, s.rig_2, s.rig_3) if rig in self.rig_ids)
+            for s in self.structures
+        ]
+        self.signatures = [
+            (int(type_id), tuple(sorted(rig_ids)), float(tax), float(index))
+            for type_id, rig_ids, tax, index in zip(self.structure_type_ids, self.structure_rig_ids, self.taxes, self.manufacturing)
+        ]
+        self.by_name = {s.structure: i for i, s in enumerate(self.structures)}
+
+    @property
+    def structure_names(self) -> list[str]:
+        return [s.structure for s in self.structures]
+
+    def structure_frame(self) -> pd.DataFrame:
+        """Structure inputs in the shape used by the local cost calculator."""
+        return pd.DataFrame({
+            "structure": self.structure_names,
+            "structure_type_id": self.structure_type_ids,
+            "system_id": self.system_ids,
+            "tax": self.taxes,
+            "rig_1": [s.rig_1 for s in self.structures],
+            "rig_2": [s.rig_2 for s in self.structures],
+            "rig_3": [s.rig_3 for s in self.structures],
+            "manufacturing": self.manufacturing,
+        })
+
+    def group_by_signature(self, indices) -> dict[int, list[int]]:
+        """Group structure positions by cost signature, keyed by the first position in each group.
+
+        Structures with the same type, valid rigs, tax and manufacturing cost
+        index cost the same, so each group only needs to be priced once.
+        """
+        first = {}
+        groups = {}
+        for i in indices:
+            representative = first.setdefault(self.signatures[i], i)
+            groups.setdefault(representative, []).append(i)
+        return groups
+
+    def cost_url(self, i: int, product_id: int, runs: int, me: int, te: int, security: str = "NULL_SEC", system_cost_bonus: float = 0.0) -> str:
+        """everef industry cost URL for the structure at position i."""
+        structure = self.structures[i]
+        system_cost_index = self.manufacturing[i]
+        if np.isnan(system_cost_index):
+            raise Exception(f"No manufacturing cost index found for {structure.system_id}")
+        rigs = "".join(f"&rig_id={rig_id}" for rig_id in self.structure_rig_ids[i])
+        return f"{everef_cost_url}?product_id={product_id}&runs={runs}&me={me}&te={te}&structure_type_id={structure.structure_type_id}&security={security}{rigs}&system_cost_bonus={system_cost_bonus}&manufacturing_cost={system_cost_index}&facility_tax={self.taxes[i]}"
+
+
+def load_catalog(index_version: str) -> BuildCostCatalog:
+    """Read structures, rigs and manufacturing cost indexes from build_cost.db."""
+    engine = sa.create_engine(build_cost_url)
+    with engine.connect() as conn:
+        structures = conn.execute(
+            sa.select(Structure).filter(Structure.structure_type_id.in_(valid_structures))
+        ).fetchall()
+        rigs = conn.execute(sa.text("SELECT type_name, type_id FROM rigs")).fetchall()
+        indexes = conn.execute(sa.text("SELECT solar_system_id, manufacturing FROM industry_index")).fetchall()
+    engine.dispose()
+
+    rig_ids = {name: type_id for name, type_id in rigs if type_id not in invalid_rigs}
+    cost_indexes = {int(system_id): float(index) for system_id, index in indexes if index is not None}
+    logger.info(f"Loaded build cost catalog for index version {index_version}: {len(structures)} structures")
+    return BuildCostCatalog(index_version, list(structures), rig_ids, cost_indexes)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_catalog(index_version: str) -> BuildCostCatalog:
+    """Catalog shared by all sessions, loaded once per industry index version."""
+    return load_catalog(index_version)
+
+
+if __name__ == "__main__":
+    pass
@@ -46,7 +46,49 @@ class Rig(Base):
 
     def __repr__(self):
         return f"<Rig(type_id={self.type_id}, type_name={self.type_name}, icon_id={self.icon_id})>"
-    
+
+class MarketPrice(Base):
+    __tablename__ = "market_prices"
+    type_id = Column(Integer, primary_key=True)
+    adjusted_price = Column(Float)
+    average_price = Column(Float)
+    fetched_at = Column(String)
+
+    def __repr__(self):
+        return f"<MarketPrice(type_id={self.type_id}, adjusted_price={self.adjusted_price}, average_price={self.average_price}, fetched_at={self.fetched_at})>"
+
+class BuildCostResult(Base):
+    __tablename__ = "build_cost_results"
+    product_id = Column(Integer, primary_key=True)
+    runs = Column(Integer, primary_key=True)
+    me = Column(Integer, primary_key=True)
+    te = Column(Integer, primary_key=True)
+    structure_id = Column(Integer, primary_key=True)
+    index_version = Column(String, primary_key=True)
+    tax = Column(Float, primary_key=True)
+    total_cost = Column(Float)
+    total_cost_per_unit = Column(Float)
+    total_material_cost = Column(Float)
+    facility_tax = Column(Float)
+    scc_surcharge = Column(Float)
+    system_cost_index = Column(Float)
+    total_job_cost = Column(Float)
+    created_at = Column(String)
+
+    def __repr__(self):
+        return f"<BuildCostResult(product_id={self.product_id}, runs={self.runs}, me={self.me}, te={self.te}, structure_id={self.structure_id}, index_version={self.index_version}, tax={self.tax}, total_cost={self.total_cost})>"
+
+class IndustryIndexState(Base):
+    __tablename__ = "industry_index_state"
+    url = Column(String, primary_key=True)
+    etag = Column(String)
+    last_modified = Column(String)
+    expires = Column(String)
+    checked_at = Column(String)
+
+    def __repr__(self):
+        return f"<IndustryIndexState(url={self.url}, etag={self.etag}, last_modified={self.last_modified}, expires={self.expires}, checked_at={self.checked_at})>"
+
 if __name__ == "__main__":
     pass
 
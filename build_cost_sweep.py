@@ -0,0 +1,133 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import plotly.express as px
+
+from build_cost_catalog import BuildCostCatalog
+from build_sheet import cost_item
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+max_workers = 8
+max_grid_size = 500
+
+sweep_columns = [
+    "runs",
+    "me",
+    "te",
+    "structure",
+    "total_cost",
+    "total_cost_per_unit",
+    "total_material_cost",
+    "total_job_cost",
+]
+
+
+def parse_values(text: str, lower: int, upper: int) -> list[int]:
+    """Parse "1,5,10-50:10" style input into sorted unique values within [lower, upper].
+
+    Items are single values or start-stop ranges (inclusive) with an optional :step.
+    """
+    values = set()
+    for item in text.replace(" ", "").split(","):
+        if not item:
+            continue
+        step = 1
+        if ":" in item:
+            item, step = item.split(":")
+            step = int(step)
+            if step < 1:
+                raise ValueError(f"Step must be at least 1: {step}")
+        if "-" in item:
+            start, stop = (int(v) for v in item.split("-"))
+            values.update(range(start, stop + 1, step))
+        else:
+            values.add(int(item))
+    out_of_range = [v for v in values if v < lower or v > upper]
+    if out_of_range:
+        raise ValueError(f"Values must be between {lower} and {upper}: {sorted(out_of_range)}")
+    if not values:
+        raise ValueError("No values given")
+    return sorted(values)
+
+
+def sweep_grid(runs_values: list[int], me_values: list[int], te_values: list[int]) -> list[tuple[int, int, int]]:
+    """Unique (runs, me, te) combinations, in order."""
+    return sorted(set(itertools.product(runs_values, me_values, te_values)))
+
+
+def sweep_costs(type_id: int, runs_values: list[int], me_values: list[int], te_values: list[int], catalog: BuildCostCatalog, source: str = "local", top_n: int | None = None, security: str = "NULL_SEC", progress=None) -> pd.DataFrame:
+    """Cost one item at every structure for each runs/ME/TE combination.
+
+    Identical jobs are only costed once. TE does not change the local estimate,
+    so local sweeps cost each runs/ME pair once and share it across TE values.
+    progress, if given, is called with (completed, total) as jobs finish.
+    """
+    grid = sweep_grid(runs_values, me_values, te_values)
+    if len(grid) > max_grid_size:
+        raise ValueError(f"Sweep of {len(grid)} combinations exceeds the limit of {max_grid_size}")
+
+    def job_key(runs, me, te):
+        return (runs, me, None) if source == "local" else (runs, me, te)
+
+    jobs = list(dict.fromkeys(job_key(*combo) for combo in grid))
+    logger.info(f"Sweeping {type_id}: {len(grid)} combinations, {len(jobs)} unique jobs ({source})")
+
+    costs = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(cost_item, type_id, runs, me, te if te is not None else te_values[0], catalog, source, top_n, security): (runs, me, te)
+            for runs, me, te in jobs
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            costs[futures[future]] = future.result()
+            if progress:
+                progress(done, len(futures))
+
+    frames = []
+    for runs, me, te in grid:
+        result = costs.get(job_key(runs, me, te))
+        if result is None or result.empty:
+            continue
+        frame = result.rename_axis("structure").reset_index()
+        frame["runs"], frame["me"], frame["te"] = runs, me, te
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=sweep_columns)
+    df = pd.concat(frames, ignore_index=True)
+    return df[sweep_columns].sort_values(["structure", "runs", "me", "te"]).reset_index(drop=True)
+
+
+def cost_surface(df: pd.DataFrame, structure: str | None = None) -> pd.DataFrame:
+    """Cost per unit by runs (rows) and ME (columns) for one structure, or the cheapest structure if None.
+
+    TE values are collapsed to the cheapest result.
+    """
+    if structure is not None:
+        df = df[df["structure"] == structure]
+    return df.pivot_table(index="runs", columns="me", values="total_cost_per_unit", aggfunc="min")
+
+
+def create_sweep_chart(df: pd.DataFrame, structure: str | None = None):
+    surface = cost_surface(df, structure)
+    data = surface.reset_index().melt(id_vars="runs", var_name="me", value_name="total_cost_per_unit")
+    data["me"] = data["me"].astype(str)
+    title = f"Cost per unit at {structure}" if structure else "Cost per unit at the cheapest structure"
+    fig = px.line(
+        data,
+        x="runs",
+        y="total_cost_per_unit",
+        color="me",
+        markers=True,
+        title=title,
+        labels={"runs": "Runs", "total_cost_per_unit": "Cost per unit", "me": "ME"},
+    )
+    fig.update_layout(hovermode="x unified")
+    return fig
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,244 @@
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+import sqlalchemy as sa
+
+from build_cost_cache import get_cached_costs, store_costs
+from build_cost_calculator import calculate_costs
+from build_cost_catalog import BuildCostCatalog, load_catalog
+from db_handler import get_4H_prices, get_groups_for_category
+from industry_index import industry_index
+from logging_config import setup_logging
+from price_feed import jita_prices
+
+logger = setup_logging(__name__)
+
+build_cost_url = "sqlite:///build_cost.db"
+industry_types_file = "industry_types.csv"
+max_workers = 8
+
+sheet_columns = [
+    "type_id",
+    "type_name",
+    "best_structure",
+    "cost_per_unit",
+    "structures_costed",
+    "price_4H",
+    "profit_4H",
+    "margin_4H",
+    "price_jita",
+    "profit_jita",
+    "margin_jita",
+]
+
+
+def get_sheet_items(group_ids: list[int]) -> pd.DataFrame:
+    """Get the buildable types in the given groups from the industry_types data."""
+    df = pd.read_csv(industry_types_file)
+    df = df[df['groupID'].isin(group_ids)]
+    df = df.drop_duplicates(subset=['typeID'])
+    return df[['typeID', 'typeName']].reset_index(drop=True)
+
+
+def fetch_everef_cost(url: str, product_id: int, timeout: float = 20) -> dict | None:
+    try:
+        response = requests.get(url, timeout=timeout)
+    except requests.RequestException as e:
+        logger.error(f"Error fetching {url}: {e}")
+        return None
+    if response.status_code != 200:
+        logger.error(f"Error fetching {url}: {response.status_code}")
+        return None
+    try:
+        data = response.json()['manufacturing'][str(product_id)]
+    except KeyError as e:
+        logger.error(f"Error: {e} No data found for {product_id}")
+        return None
+    return {
+        "total_cost": data['total_cost'],
+        "total_cost_per_unit": data['total_cost_per_unit'],
+        "total_material_cost": data['total_material_cost'],
+        "facility_tax": data['facility_tax'],
+        "scc_surcharge": data['scc_surcharge'],
+        "system_cost_index": data['system_cost_index'],
+        "total_job_cost": data['total_job_cost']
+    }
+
+
+def fetch_structure_costs(type_id: int, runs: int, me: int, te: int, catalog: BuildCostCatalog, structures, security: str = "NULL_SEC", progress=None) -> dict:
+    """Query everef once per cost signature and fan the result out to every structure name.
+
+    progress, if given, is called with (completed, total) as signatures are fetched.
+    """
+    groups = catalog.group_by_signature(catalog.by_name[s.structure] for s in structures)
+    logger.info(f"Fetching {type_id} for {len(groups)} unique cost signatures ({len(structures)} structures)")
+    results = {}
+    for done, (i, members) in enumerate(groups.items(), start=1):
+        result = fetch_everef_cost(catalog.cost_url(i, type_id, runs, me, te, security), type_id)
+        if result is not None:
+            for member in members:
+                results[catalog.structures[member].structure] = dict(result)
+        if progress:
+            progress(done, len(groups))
+    return results
+
+
+def cost_item(type_id: int, runs: int, me: int, te: int, catalog: BuildCostCatalog, source: str = "local", top_n: int | None = None, security: str = "NULL_SEC") -> pd.DataFrame | None:
+    """Cost one item across structures; everef is only queried for the top_n structures ranked locally."""
+    try:
+        local = calculate_costs(type_id, runs, me, catalog.structure_frame(), security)
+    except Exception as e:
+        logger.error(f"Local cost calculation failed for {type_id}: {e}")
+        local = None
+
+    if source == "local":
+        return local
+
+    if local is not None and top_n:
+        names = local.sort_values("total_cost").index[:top_n]
+    else:
+        names = catalog.structure_names
+    structures = [catalog.structures[catalog.by_name[name]] for name in names]
+
+    results = get_cached_costs(type_id, runs, me, te, catalog.index_version, structures)
+    missing = [s for s in structures if s.structure not in results]
+    new_results = fetch_structure_costs(type_id, runs, me, te, catalog, missing, security)
+    store_costs(type_id, runs, me, te, catalog.index_version, missing, new_results)
+    results.update(new_results)
+
+    if not results:
+        return None
+    return pd.DataFrame.from_dict(results, orient="index")
+
+
+def build_sheet(group_ids: list[int], runs: int, me: int, te: int, catalog: BuildCostCatalog, source: str = "local", top_n: int | None = None, security: str = "NULL_SEC", progress=None) -> pd.DataFrame:
+    """Cost every item in the groups and rank them by margin against 4-HWWF and Jita prices.
+
+    progress, if given, is called with (completed, total) as items finish.
+    """
+    items = get_sheet_items(group_ids)
+    names = dict(zip(items['typeID'], items['typeName']))
+    logger.info(f"Building sheet for {len(items)} items in groups {group_ids} ({source})")
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(cost_item, int(type_id), runs, me, te, catalog, source, top_n, security): int(type_id)
+            for type_id in items['typeID']
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            type_id = futures[future]
+            costs = future.result()
+            if costs is not None and not costs.empty:
+                best = costs['total_cost_per_unit'].idxmin()
+                rows.append({
+                    "type_id": type_id,
+                    "type_name": names[type_id],
+                    "best_structure": best,
+                    "cost_per_unit": float(costs.loc[best, 'total_cost_per_unit']),
+                    "structures_costed": len(costs),
+                })
+            if progress:
+                progress(done, len(futures))
+
+    df = pd.DataFrame(rows, columns=sheet_columns[:5])
+    if df.empty:
+        return pd.DataFrame(columns=sheet_columns)
+
+    type_ids = df['type_id'].tolist()
+    vale_prices = get_4H_prices(type_ids).set_index('type_id')['price']
+    jita = pd.Series(jita_prices.get_prices(type_ids), dtype=float)
+
+    df['price_4H'] = df['type_id'].map(vale_prices)
+    df['profit_4H'] = df['price_4H'] - df['cost_per_unit']
+    df['margin_4H'] = df['profit_4H'] / df['price_4H'] * 100
+    df['price_jita'] = df['type_id'].map(jita)
+    df['profit_jita'] = df['price_jita'] - df['cost_per_unit']
+    df['margin_jita'] = df['profit_jita'] / df['price_jita'] * 100
+
+    df = df.sort_values(['margin_4H', 'margin_jita'], ascending=False, na_position='last')
+    return df[sheet_columns].reset_index(drop=True)
+
+
+def sheet_key(group_ids: list[int], runs: int, me: int, te: int, source: str, top_n: int | None, index_version: str) -> str:
+    groups = "-".join(str(g) for g in sorted(group_ids))
+    return f"{groups}:{runs}:{me}:{te}:{source}:{top_n or 'all'}:{index_version}"
+
+
+def save_build_sheet(df: pd.DataFrame, key: str):
+    """Store a build sheet in build_cost.db, replacing any sheet with the same key.
+
+    The key is also recorded in build_sheet_keys, so a sheet with no items is
+    remembered as built.
+    """
+    df = df.copy()
+    created_at = datetime.datetime.now().astimezone(datetime.UTC).isoformat()
+    df['sheet_key'] = key
+    df['created_at'] = created_at
+    engine = sa.create_engine(build_cost_url)
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE IF NOT EXISTS build_sheet_keys (sheet_key TEXT PRIMARY KEY, created_at TEXT NOT NULL, items INTEGER NOT NULL)"))
+        conn.execute(sa.text("INSERT OR REPLACE INTO build_sheet_keys VALUES (:key, :created_at, :items)"), {"key": key, "created_at": created_at, "items": len(df)})
+        if sa.inspect(conn).has_table("build_sheets"):
+            conn.execute(sa.text("DELETE FROM build_sheets WHERE sheet_key = :key"), {"key": key})
+        df.to_sql("build_sheets", conn, if_exists="append", index=False)
+    logger.info(f"Saved build sheet {key}: {len(df)} items")
+
+
+def load_build_sheet(key: str) -> pd.DataFrame | None:
+    """The stored sheet for key (empty if it had no items), or None if it was never built."""
+    engine = sa.create_engine(build_cost_url)
+    with engine.connect() as conn:
+        inspector = sa.inspect(conn)
+        if not inspector.has_table("build_sheets"):
+            return None
+        df = pd.read_sql_query(sa.text("SELECT * FROM build_sheets WHERE sheet_key = :key"), conn, params={"key": key})
+        if df.empty:
+            # sheets saved before build_sheet_keys existed are only known by their rows
+            if not inspector.has_table("build_sheet_keys"):
+                return None
+            created_at = conn.execute(sa.text("SELECT created_at FROM build_sheet_keys WHERE sheet_key = :key"), {"key": key}).scalar()
+            if created_at is None:
+                return None
+            return df.assign(created_at=created_at)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost every item in a group or category and rank by margin")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--group", type=int, nargs="+", help="group id(s) from industry_types.csv")
+    target.add_argument("--category", type=int, help="category id from build_catagories.csv")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--me", type=int, default=10)
+    parser.add_argument("--te", type=int, default=10)
+    parser.add_argument("--source", choices=["local", "everef"], default="local")
+    parser.add_argument("--top", type=int, default=None, help="only query everef for the N best structures")
+    parser.add_argument("--index-version", default=None, help="industry index version used for cache keys (default: refresh and use the stored indexes)")
+    parser.add_argument("--output", help="also write the sheet to this CSV file")
+    args = parser.parse_args()
+
+    if args.category is not None:
+        group_ids = get_groups_for_category(args.category)['groupID'].tolist()
+    else:
+        group_ids = args.group
+
+    index_version = args.index_version
+    if index_version is None:
+        industry_index.refresh()
+        index_version = industry_index.index_version() or "uncached"
+
+    catalog = load_catalog(index_version)
+    df = build_sheet(group_ids, args.runs, args.me, args.te, catalog, args.source, args.top)
+    save_build_sheet(df, sheet_key(group_ids, args.runs, args.me, args.te, args.source, args.top, index_version))
+
+    if args.output:
+        df.to_csv(args.output, index=False)
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+max_points = 500
+price_bins = 50
+
+
+def bin_volume(prices, volumes, bins: int = price_bins, log: bool = False) -> pd.DataFrame:
+    """Total volume per price bin (bin edges, centre and volume), computed with numpy.
+
+    Log-spaced bins suit "Show All Data", where prices span several orders of
+    magnitude; they fall back to linear bins if any price is not positive.
+    """
+    prices = np.asarray(prices, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    valid = np.isfinite(prices) & np.isfinite(volumes)
+    prices, volumes = prices[valid], volumes[valid]
+    if len(prices) == 0:
+        return pd.DataFrame(columns=["left", "right", "center", "volume"])
+
+    low, high = prices.min(), prices.max()
+    if high == low:
+        edges = np.array([low - 0.5, high + 0.5]) if low == 0 else np.array([low * 0.995, high * 1.005])
+    elif log and low > 0:
+        edges = np.geomspace(low, high, bins + 1)
+    else:
+        edges = np.linspace(low, high, bins + 1)
+    totals, edges = np.histogram(prices, bins=edges, weights=volumes)
+    centers = np.sqrt(edges[:-1] * edges[1:]) if log and low > 0 else (edges[:-1] + edges[1:]) / 2
+    return pd.DataFrame({"left": edges[:-1], "right": edges[1:], "center": centers, "volume": totals})
+
+
+def lttb(x, y, threshold: int = max_points) -> np.ndarray:
+    """Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last point and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the point
+    kept before it and the mean of the next bucket. x must be sorted.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        area = np.abs((x[previous] - avg_x) * (y[start:stop] - y[previous]) - (x[previous] - x[start:stop]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        kept[i + 1] = previous
+    return kept
+
+
+def downsample(df: pd.DataFrame, x: str, y: str, threshold: int = max_points) -> pd.DataFrame:
+    """At most threshold rows of df (sorted by x), chosen by LTTB on the y column."""
+    if len(df) <= threshold:
+        return df
+    df = df.sort_values(x)
+    xs = df[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        xs = xs.astype("int64")
+    ys = df[y].fillna(0)
+    return df.iloc[lttb(xs.to_numpy(), ys.to_numpy(), threshold)]
+
+
+def bucket_sum(df: pd.DataFrame, x: str, y: str, buckets: int = max_points) -> pd.DataFrame:
+    """At most buckets rows: consecutive rows of df (sorted by x) merged, y summed and x taken from the first row.
+
+    Unlike downsample this keeps the total of y, so it suits volume bars.
+    """
+    if len(df) <= buckets:
+        return df
+    df = df.sort_values(x)
+    bucket = np.arange(len(df)) * buckets // len(df)
+    return df.groupby(bucket).agg({x: "first", y: "sum"}).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    pass
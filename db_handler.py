@@ -7,16 +7,20 @@ import requests
 from tenacity import retry, stop_after_attempt, wait_exponential
 import pytz
 from logging_config import setup_logging
+from presentation import to_numeric
 import time
 import threading
 import datetime
 from db_utils import sync_db
+import snapshots
+from stock_forecast import forecast_columns
 import json
 import libsql_experimental as libsql
 
 # Database URLs
 local_mkt_url = "sqlite:///wcmkt.db"  # Changed to standard SQLite format for local dev
 local_sde_url = "sqlite:///sde.db"    # Changed to standard SQLite format for local dev
+local_sde_db = "sde.db"  # attached read only to the market and derived engines as "sde"
 build_cost_url = "sqlite:///build_cost.db"
 # Load environment variables
 logger = setup_logging(__name__)
@@ -66,6 +70,107 @@ def get_mkt_data(base_query):
     logger.info("\n")
     return df
 
+order_columns = """
+    mo.order_id, mo.type_id, mo.type_name, ig.groupName as group_name, ic.categoryName as category_name,
+    mo.price, mo.volume_remain, mo.duration, date(mo.issued) as issued,
+    date(mo.issued, '+' || mo.duration || ' days') as expiry,
+    MAX(0, CAST(julianday(mo.issued, '+' || mo.duration || ' days') - julianday('now', 'localtime') AS INTEGER)) as days_remaining
+"""
+
+# type -> group -> category from the attached SDE for the table aliased {table}. Filters use inner joins,
+# which let SQLite start from the matching SDE rows and look orders up by type_id; LEFT JOIN only enriches
+sde_join = """
+    {join} sde.invTypes it ON it.typeID = {table}.type_id
+    {join} sde.invGroups ig ON ig.groupID = it.groupID
+    {join} sde.invCategories ic ON ic.categoryID = ig.categoryID
+"""
+
+# sort keys offered by the order tables; values are trusted SQL
+order_sort_columns = {
+    "type_id": "mo.type_id",
+    "type_name": "mo.type_name",
+    "price": "mo.price",
+    "volume_remain": "mo.volume_remain",
+    "issued": "mo.issued",
+    "expiry": "expiry",
+}
+
+def _type_filter(category: str | None, item: str | None):
+    conditions, params = [], {}
+    if category is not None:
+        conditions.append("ic.categoryName = :category")
+        params["category"] = category
+    if item is not None:
+        conditions.append("it.typeName = :item")
+        params["item"] = item
+    return conditions, params
+
+def _order_filter(is_buy_order: bool, category: str | None, item: str | None, min_price: float | None, max_price: float | None):
+    conditions, params = _type_filter(category, item)
+    conditions.insert(0, "mo.is_buy_order = :is_buy_order")
+    params["is_buy_order"] = int(is_buy_order)
+    if min_price is not None:
+        conditions.append("mo.price >= :min_price")
+        params["min_price"] = min_price
+    if max_price is not None:
+        conditions.append("mo.price <= :max_price")
+        params["max_price"] = max_price
+    join = sde_join.format(join="JOIN", table="mo") if category is not None or item is not None else ""
+    return join, " AND ".join(conditions), params
+
+@st.cache_data(ttl=600)
+def get_order_summary(is_buy_order: bool, category: str | None = None, item: str | None = None, min_price: float | None = None, max_price: float | None = None) -> dict:
+    """Order count, total value, volume and price range for the matching orders (no category or item means all)."""
+    join, where, params = _order_filter(is_buy_order, category, item, min_price, max_price)
+    query = f"""
+        SELECT COUNT(*) as orders, COALESCE(SUM(mo.price * mo.volume_remain), 0) as value,
+               COALESCE(SUM(mo.volume_remain), 0) as volume, MIN(mo.price) as min_price, MAX(mo.price) as max_price
+        FROM marketorders mo
+        {join}
+        WHERE {where}
+    """
+    with get_local_mkt_engine().connect() as conn:
+        return dict(conn.execute(text(query), params).mappings().one())
+
+@st.cache_data(ttl=600)
+def get_order_page(is_buy_order: bool, category: str | None = None, item: str | None = None, page: int = 1, page_size: int = 100, sort: str = "type_id", descending: bool = False, min_price: float | None = None, max_price: float | None = None) -> pd.DataFrame:
+    """One page of orders with their group and category, filtered and sorted in SQL so only the visible rows are loaded."""
+    if sort not in order_sort_columns:
+        raise ValueError(f"Unknown sort key: {sort}")
+    join, where, params = _order_filter(is_buy_order, category, item, min_price, max_price)
+    params.update(limit=page_size, offset=(page - 1) * page_size)
+    query = f"""
+        SELECT {order_columns}
+        FROM marketorders mo
+        {join or sde_join.format(join="LEFT JOIN", table="mo")}
+        WHERE {where}
+        ORDER BY {order_sort_columns[sort]} {"DESC" if descending else "ASC"}, mo.order_id
+        LIMIT :limit OFFSET :offset
+    """
+    with get_local_mkt_engine().connect() as conn:
+        return pd.read_sql_query(text(query), conn, params=params)
+
+@st.cache_data(ttl=600)
+def get_order_prices(is_buy_order: bool, category: str | None = None, item: str | None = None) -> pd.DataFrame:
+    """Just price and volume_remain of the matching orders, for binned charts."""
+    join, where, params = _order_filter(is_buy_order, category, item, None, None)
+    query = f"SELECT mo.price, mo.volume_remain FROM marketorders mo {join} WHERE {where}"
+    with get_local_mkt_engine().connect() as conn:
+        return pd.read_sql_query(text(query), conn, params=params)
+
+@st.cache_data(ttl=600)
+def get_market_types(is_buy_order: bool = False) -> pd.DataFrame:
+    """Distinct types with orders on the market and their SDE group and category, in one joined query."""
+    query = f"""
+        SELECT DISTINCT it.typeName as type_name, it.typeID as type_id, ig.groupID as group_id, ig.groupName as group_name,
+               ic.categoryID as category_id, ic.categoryName as category_name
+        FROM marketorders mo
+        {sde_join.format(join="JOIN", table="mo")}
+        WHERE mo.is_buy_order = :is_buy_order
+    """
+    with get_local_mkt_engine().connect() as conn:
+        return pd.read_sql_query(text(query), conn, params={"is_buy_order": int(is_buy_order)})
+
 def request_type_names(type_ids):
     logger.info(f"requesting type names with cache")
     # Process in chunks of 1000
@@ -156,17 +261,8 @@ def get_fitting_data(type_id):
         df3.drop(columns=['ship_id', 'hulls', 'group_id', 'category_name', 'id', 'timestamp'], inplace=True)
 
 
-        numeric_formats = {
-
-            'total_stock': '{:,.0f}',
-            '4H_price': '{:,.2f}',
-            'avg_vol': '{:,.0f}',
-            'days': '{:,.0f}',
-        }
-
-        for col, format_str in numeric_formats.items():
-            if col in df3.columns:  # Only format if column exists
-                df3[col] = df3[col].apply(lambda x: safe_format(x, format_str))
+        # keep numbers numeric; pages format them through st.column_config
+        df3 = to_numeric(df3, {'total_stock': 0, '4H_price': 2, 'avg_vol': 0, 'days': 0})
         df3.rename(columns={'fits_on_mkt': 'Fits on Market'}, inplace=True)
         df3 = df3.sort_values(by='Fits on Market', ascending=True)
         df3.reset_index(drop=True, inplace=True)
@@ -174,15 +270,75 @@ def get_fitting_data(type_id):
 
 @st.cache_resource(ttl=600)
 def get_local_mkt_engine():
-    return create_engine(local_mkt_url, echo=False)  # Set echo=False to reduce console output
+    # the replica, or the current snapshot in worker mode; caches are cleared when a new one is published
+    return snapshots.create_engine(snapshots.market_db_path(), attach={"sde": local_sde_db}, echo=False)  # Set echo=False to reduce console output
 
 @st.cache_resource(ttl=600)
 def get_local_mkt_db(query: str) -> pd.DataFrame:
-    engine = create_engine(local_mkt_url, echo=False)
+    engine = get_local_mkt_engine()
     with engine.connect() as conn:
         df = pd.read_sql_query(query, conn)
     return df
 
+@st.cache_resource(ttl=600)
+def get_derived_engine():
+    # tables built by the post-sync pipeline (see pipeline_stages.py)
+    return snapshots.create_engine(snapshots.derived_db_path(), attach={"sde": local_sde_db}, echo=False)
+
+@st.cache_data(ttl=600)
+def get_stock_forecast() -> pd.DataFrame:
+    """Projected stock-out dates and restock urgency per type; empty until the pipeline has run."""
+    try:
+        return pd.read_sql_query("SELECT * FROM stock_forecast", get_derived_engine(),
+            parse_dates=["stockout_date", "stockout_early", "stockout_late", "forecast_at"])
+    except Exception as e:
+        logger.error(f"Error reading stock forecast: {e}")
+        return pd.DataFrame(columns=forecast_columns)
+
+@st.cache_data(ttl=600)
+def get_order_depth(category: str | None = None, item: str | None = None) -> pd.DataFrame:
+    """Best bid/ask, spread and volume near the best price per type; empty until the pipeline has run."""
+    conditions, params = _type_filter(category, item)
+    query = "SELECT od.* FROM order_depth od"
+    if conditions:
+        query += sde_join.format(join="JOIN", table="od") + " WHERE " + " AND ".join(conditions)
+    try:
+        with get_derived_engine().connect() as conn:
+            return pd.read_sql_query(text(query), conn, params=params)
+    except Exception as e:
+        logger.error(f"Error reading order depth: {e}")
+        return pd.DataFrame()
+
+@st.cache_resource(ttl=600)
+def get_market_rollup() -> dict:
+    """Rollup cube cells by (level, key, side) and (level, name, side); empty until the pipeline has run."""
+    try:
+        df = pd.read_sql_query("SELECT * FROM market_rollup", get_derived_engine())
+    except Exception as e:
+        logger.error(f"Error reading market rollup: {e}")
+        return {}
+    cells = {}
+    for row in df.to_dict("records"):
+        cells[(row["level"], row["key"], row["side"])] = row
+        cells[(row["level"], row["name"], row["side"])] = row
+    return cells
+
+def lookup_rollup(level: str, side: str, keys: tuple) -> dict | None:
+    """Order totals for the given type/group/category ids or names, or None if the cube hasn't been built."""
+    cube = get_market_rollup()
+    if not cube:
+        return None
+    cells = [cube[(level, key, side)] for key in keys if (level, key, side) in cube]
+    if not cells:
+        return {"orders": 0, "volume": 0, "value": 0, "min_price": None, "max_price": None}
+    return {
+        "orders": sum(cell["orders"] for cell in cells),
+        "volume": sum(cell["volume"] for cell in cells),
+        "value": sum(cell["value"] for cell in cells),
+        "min_price": min(cell["min_price"] for cell in cells),
+        "max_price": max(cell["max_price"] for cell in cells),
+    }
+
 @st.cache_resource(ttl=600)
 def get_local_sde_engine():
     return create_engine(local_sde_url, echo=False)
@@ -203,15 +359,6 @@ def get_stats(stats_query):
 
 
 
-# Helper function to safely format numbers
-def safe_format(value, format_string):
-    try:
-        if pd.isna(value) or value is None:
-            return ''
-        return format_string.format(float(value))
-    except (ValueError, TypeError):
-        return ''
-
 @st.cache_data(ttl=600)
 def get_market_history(type_id):
     query = f"""
@@ -327,6 +474,17 @@ def get_4H_price(type_id):
     except:
         return None
     
+def get_4H_prices(type_ids: list[int]) -> pd.DataFrame:
+    """Get 4-HWWF prices for many type_ids in one query."""
+    if not type_ids:
+        return pd.DataFrame(columns=['type_id', 'price'])
+    type_ids_str = ','.join(str(int(type_id)) for type_id in type_ids)
+    query = f"""
+        SELECT type_id, price FROM marketstats WHERE type_id IN ({type_ids_str})
+        """
+    df = pd.read_sql_query(query, (get_local_mkt_engine()))
+    return df.drop_duplicates(subset=['type_id'])
+
 def update_taxes(df):
     updates = df.to_dict(orient='records')
 
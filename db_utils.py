@@ -1,20 +1,25 @@
 import pandas as pd
-import datetime
 from sqlalchemy import create_engine
 import streamlit as st
 import libsql_experimental as libsql
 from logging_config import setup_logging
-import json
+import datetime
+import os
+from contextlib import closing
+import sqlite3
 import time
-from sync_scheduler import schedule_next_sync
-import requests
+import threading
+from sync_scheduler import SyncScheduler
+from sync_state import sync_state
+from industry_index import industry_index
+from pipeline_stages import pipeline
+import snapshots
 
 logger = setup_logging(__name__)
 
 # Database URLs
 local_mkt_url = "sqlite:///wcmkt.db"  # Changed to standard SQLite format for local dev
 local_sde_url = "sqlite:///sde.db"    # Changed to standard SQLite format for local dev
-build_cost_url = "sqlite:///build_cost.db"
 
 
 # Use environment variables for production
@@ -24,13 +29,15 @@ mkt_auth_token = st.secrets["TURSO_AUTH_TOKEN"]
 sde_url = st.secrets["SDE_URL"]
 sde_auth_token = st.secrets["SDE_AUTH_TOKEN"]
 
-def sync_db(db_url="wcmkt.db", sync_url=mkt_url, auth_token=mkt_auth_token):
+def sync_db(db_url="wcmkt.db", sync_url=mkt_url, auth_token=mkt_auth_token) -> bool:
+    """Sync the local replica; returns False if the database doesn't support sync, raises on failure.
+
+    Sync state and scheduling are handled by the SyncScheduler (see get_sync_scheduler).
+    """
     logger.info("database sync started")
 
     # Clear cache of all data before syncing
-    st.cache_data.clear()
-    st.cache_resource.clear()
-    logger.info("cache cleared")
+    clear_caches()
     
     sleep_time = 0.5
     time.sleep(sleep_time)
@@ -41,6 +48,11 @@ def sync_db(db_url="wcmkt.db", sync_url=mkt_url, auth_token=mkt_auth_token):
         logger.info("Skipping database sync in development mode or missing sync credentials")
         
         
+    started_at = datetime.datetime.now(datetime.UTC)
+    ended_at = None
+    size_before = replica_size(db_url)
+    counts_before = table_row_counts(db_url)
+    run = {"status": "failed", "error": None}
     try:
         sync_start = time.time()
         conn = libsql.connect(db_url, sync_url=sync_url, auth_token=auth_token)
@@ -48,45 +60,78 @@ def sync_db(db_url="wcmkt.db", sync_url=mkt_url, auth_token=mkt_auth_token):
         logger.info(f"="*80)
         logger.info(f"Database sync started at {sync_start}")
         conn.sync()
+        ended_at = datetime.datetime.now(datetime.UTC)
         logger.info(f"Database synced in {1000*(time.time() - sync_start)} milliseconds")
+        counts_after = table_row_counts(db_url)
+        run["row_deltas"] = {
+            table: counts_after.get(table, 0) - counts_before.get(table, 0)
+            for table in sorted(set(counts_before) | set(counts_after))
+        }
 
-        last_sync = datetime.datetime.now().astimezone(datetime.UTC)
-        logger.info(f"updated Last sync: {last_sync.strftime('%Y-%m-%d %H:%M %Z')}")
-        
-        # Use schedule_next_sync to determine the next sync time
-        next_sync = schedule_next_sync(last_sync)
-        logger.info(f"updated Next sync: {next_sync.strftime('%Y-%m-%d %H:%M %Z')}")
-
-        # Save sync state with sync_times preserved
-        with open("last_sync_state.json", "r") as f:
-            current_state = json.load(f)
-        
-        current_state.update({
-            "last_sync": last_sync.strftime("%Y-%m-%d %H:%M %Z"),
-            "next_sync": next_sync.strftime("%Y-%m-%d %H:%M %Z")
-        })
-        
-        with open("last_sync_state.json", "w") as f:
-            json.dump(current_state, f)
-            
-        logger.info(f"Last sync state updated to: {last_sync.strftime('%Y-%m-%d %H:%M %Z')}")
-        logger.info(f"Next sync state updated to: {next_sync.strftime('%Y-%m-%d %H:%M %Z')}")
-     
-
-        #update session state
-        st.session_state.last_sync = last_sync
-        st.session_state.next_sync = next_sync
+        warmup_start = time.time()
+        pipeline.run(db_url)
+        if snapshots.deploy_mode == "syncer":
+            snapshots.snapshots.publish(db_url)
+        run["warmup_duration"] = time.time() - warmup_start
+        run["status"] = "success"
         
         logger.info(f"="*80)
         logger.info("\n")
+        return True
         
     except Exception as e:
         if "Sync is not supported" in str(e):
             logger.info("Skipping sync: This appears to be a local file database that doesn't support sync")
-            st.session_state.sync_status = "Skipping sync: This appears to be a local file database that doesn't support sync"
-        else:
-            logger.error(f"Sync failed: {str(e)}")
-            st.session_state.sync_status = f"Failed: {str(e)}"
+            run["status"] = "skipped"
+            return False
+        logger.error(f"Sync failed: {str(e)}")
+        run["error"] = str(e)
+        raise
+    finally:
+        try:
+            sync_state.record_run(started_at, ended_at or datetime.datetime.now(datetime.UTC),
+                size_before=size_before, size_after=replica_size(db_url), **run)
+        except Exception as e:
+            logger.error(f"Error recording sync run: {e}")
+
+def replica_size(db_url: str) -> int:
+    """Size in bytes of the replica file and its WAL."""
+    return sum(os.path.getsize(path) for path in (db_url, f"{db_url}-wal") if os.path.exists(path))
+
+def table_row_counts(db_url: str) -> dict[str, int]:
+    """Row count per table in the replica (empty if it can't be read).
+
+    COUNT(*) walks the narrowest index of each table rather than decoding rows,
+    and stays exact when the sync deletes rows, which a rowid span would not.
+    """
+    try:
+        with closing(sqlite3.connect(f"file:{db_url}?mode=ro", uri=True)) as conn:
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    except sqlite3.Error as e:
+        logger.error(f"Error counting rows in {db_url}: {e}")
+        return {}
+
+def clear_caches():
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    logger.info("cache cleared")
+
+_sync_scheduler = None
+_sync_scheduler_lock = threading.Lock()
+
+def get_sync_scheduler() -> SyncScheduler:
+    """The process-wide sync scheduler, started on first use.
+
+    Kept as a module global rather than st.cache_resource, because sync_db
+    clears the resource cache.
+    """
+    global _sync_scheduler
+    with _sync_scheduler_lock:
+        if _sync_scheduler is None:
+            follower = snapshots.deploy_mode == "worker"
+            _sync_scheduler = SyncScheduler(sync_db, on_external_sync=clear_caches, on_sync=clear_caches, follower=follower).start()
+    return _sync_scheduler
 
 def get_type_name(type_ids):
     engine = create_engine(local_sde_url)
@@ -97,7 +142,11 @@ def get_type_name(type_ids):
     return df
 
 def update_targets(fit_id, target_value):
-    conn = libsql.connect("wcmkt.db", sync_url=mkt_url, auth_token=mkt_auth_token)
+    if snapshots.deploy_mode == "worker":
+        # workers only read snapshots; write straight to the primary and let the syncer pick it up
+        conn = libsql.connect(mkt_url, auth_token=mkt_auth_token)
+    else:
+        conn = libsql.connect("wcmkt.db", sync_url=mkt_url, auth_token=mkt_auth_token)
     cursor = conn.cursor()
     cursor.execute(f"""UPDATE ship_targets
     SET ship_target = {target_value}
@@ -105,78 +154,9 @@ def update_targets(fit_id, target_value):
     conn.commit()
     logger.info(f"Updated target for fit_id {fit_id} to {target_value}")
     
-def update_industry_index():
-    indy_index = fetch_industry_system_cost_indices()
-    if indy_index is None:
-        logger.info("Industry index current")
-        return None
-    else:
-        engine = create_engine(build_cost_url)
-        with engine.connect() as conn:
-            indy_index.to_sql("industry_index", conn, if_exists="replace", index=False)
-        current_time = datetime.datetime.now().astimezone(datetime.UTC)
-        logger.info(f"Industry index updated at {current_time}")
-
-
-def fetch_industry_system_cost_indices():
-    url = "https://esi.evetech.net/latest/industry/systems/?datasource=tranquility"
-
-    if "etag" in st.session_state:
-        print("etag found")
-        headers = {
-            "Accept": "application/json",
-            "User-Agent": "WC Markets v0.52 (admin contact: Orthel.Toralen@gmail.com; +https://github.com/OrthelT/wcmkts_new",
-            "If-None-Match": st.session_state.etag
-        }
-    else:   
-        
-        headers = {
-            "Accept": "application/json",
-            "User-Agent": "WC Markets v0.52 (admin contact: Orthel.Toralen@gmail.com; +https://github.com/OrthelT/wcmkts_new"
-        }
-    print(headers)
-    response = requests.get(url, headers=headers)
-
-    print(response.status_code)
-    print(response.headers)
-
-    etag = response.headers.get("ETag")
-    
-    if response.status_code == 304:
-        logger.info("Industry index current, skipping update with status code 304")
-        logger.info(f"last modified: {response.headers.get('Last-Modified')}")
-        logger.info(f"next_update: {response.headers.get('Expires')}")
-        return None
-
-    elif response.status_code == 200:
-        systems_data = response.json()
-        st.session_state.etag = etag
-        st.session_state.sci_last_modified = datetime.datetime.strptime(response.headers.get('Last-Modified'), "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=datetime.timezone.utc)
-        st.session_state.sci_expires = datetime.datetime.strptime(response.headers.get('Expires'), "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=datetime.timezone.utc)
-        print(f"last modified: {st.session_state.sci_last_modified}")
-        print(f"expires: {st.session_state.sci_expires}")
-
-    else:
-        response.raise_for_status()
-
-    # Flatten data into rows of: system_id, activity, cost_index
-    flat_records = []
-    for system in systems_data:
-        system_id = system['solar_system_id']
-        for activity_info in system['cost_indices']:
-            flat_records.append({
-                'system_id': system_id,
-                'activity': activity_info['activity'],
-                'cost_index': activity_info['cost_index']
-            })
-
-    # Create DataFrame and set MultiIndex for fast lookup
-    df = pd.DataFrame(flat_records)
-    df = df.pivot(index='system_id', columns='activity', values='cost_index')
-    df.reset_index(inplace=True)
-    df.rename(columns={'system_id': 'solar_system_id'}, inplace=True)
-
-    return df
+def update_industry_index() -> bool:
+    """Refresh the industry cost indexes if they have expired; returns True if they changed."""
+    return industry_index.refresh()
 
 
 if __name__ == "__main__":
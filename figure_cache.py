@@ -0,0 +1,54 @@
+import json
+import threading
+from collections import OrderedDict
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+
+class FigureCache:
+    """Serialized Plotly figures shared by every session in the process.
+
+    Entries are keyed by (chart kind, selection, sync generation), so a sync
+    makes the old figures unreachable and they age out of the LRU. Building
+    happens outside the lock; two sessions missing the same key at once may
+    both build it.
+    """
+
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, kind: str, selection, generation: int, build) -> dict | None:
+        """The figure as a dict (st.plotly_chart accepts it), building and caching it with build() on a miss.
+
+        build may return None (nothing to chart); that is cached too.
+        """
+        key = (kind, selection, generation)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                figure_json = self._items[key]
+                return json.loads(figure_json) if figure_json is not None else None
+
+        figure = build()
+        figure_json = figure.to_json() if figure is not None else None
+        with self._lock:
+            self._items[key] = figure_json
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return json.loads(figure_json) if figure_json is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+figures = FigureCache()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from sqlalchemy import create_engine, text
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+image_cache_dir = "image_cache"
+image_server = "https://images.evetech.net/types"
+local_mkt_url = "sqlite:///wcmkt.db"
+
+
+def image_url(type_id: int, kind: str = "render", size: int = 64) -> str:
+    return f"{image_server}/{type_id}/{kind}?size={size}"
+
+
+class ImageCache:
+    """EVE type images cached in memory and on disk, fetched off the request thread.
+
+    Missing images (e.g. renders for modules) are remembered for missing_ttl
+    seconds so they are not requested again on every page view.
+    """
+
+    def __init__(self, cache_dir: str = image_cache_dir, max_memory_items: int = 512, missing_ttl: float = 86400, max_workers: int = 4, timeout: float = 10):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.missing_ttl = missing_ttl
+        self.timeout = timeout
+        self._memory = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image_cache")
+
+    def _path(self, type_id: int, kind: str, size: int) -> str:
+        return os.path.join(self.cache_dir, f"{type_id}_{kind}_{size}.png")
+
+    def _remember(self, key: tuple, data: bytes):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, type_id: int, kind: str = "render", size: int = 64) -> bytes | None:
+        """Cached image bytes, or None; never touches the network."""
+        key = (int(type_id), kind, size)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        path = self._path(*key)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            self._remember(key, data)
+            return data
+        return None
+
+    def is_missing(self, type_id: int, kind: str = "render", size: int = 64) -> bool:
+        path = self._path(int(type_id), kind, size) + ".missing"
+        try:
+            return time.time() - os.path.getmtime(path) < self.missing_ttl
+        except OSError:
+            return False
+
+    def fetch(self, type_id: int, kind: str = "render", size: int = 64) -> bytes | None:
+        """Download an image into the cache; records a negative entry if it does not exist."""
+        key = (int(type_id), kind, size)
+        path = self._path(*key)
+        try:
+            response = requests.get(image_url(*key), timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.error(f"Error fetching image {image_url(*key)}: {e}")
+            return None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if response.status_code == 200 and "image" in response.headers.get("content-type", ""):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(response.content)
+            os.replace(tmp_path, path)
+            self._remember(key, response.content)
+            return response.content
+        if response.status_code == 404:
+            with open(path + ".missing", "w"):
+                pass
+        else:
+            logger.error(f"Error fetching image {image_url(*key)}: {response.status_code}")
+        return None
+
+    def _fetch_pending(self, key: tuple):
+        try:
+            self.fetch(*key)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def request(self, type_id: int, kind: str = "render", size: int = 64):
+        """Queue a background download unless the image is cached, missing or already queued."""
+        key = (int(type_id), kind, size)
+        if self.get(*key) is not None or self.is_missing(*key):
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._fetch_pending, key)
+
+    def prefetch(self, type_ids, kind: str = "render", size: int = 64):
+        for type_id in type_ids:
+            self.request(type_id, kind, size)
+
+
+images = ImageCache()
+
+
+def type_image(type_id: int, kind: str = "render", size: int = 64) -> bytes | str:
+    """Image for st.image: cached bytes if available, otherwise the remote URL.
+
+    Renders known to be missing fall back to the type icon. Uncached images are
+    downloaded in the background for the next view.
+    """
+    data = images.get(type_id, kind, size)
+    if data is not None:
+        return data
+    if kind == "render" and images.is_missing(type_id, kind, size):
+        return type_image(type_id, "icon", 64)
+    images.request(type_id, kind, size)
+    return image_url(type_id, kind, size)
+
+
+def prefetch_doctrine_images(engine=None):
+    """Queue renders for every doctrine ship (and the larger lead ship renders)."""
+    owned = engine is None
+    if owned:
+        engine = create_engine(local_mkt_url)
+    try:
+        with engine.connect() as conn:
+            ship_ids = [row[0] for row in conn.execute(text("SELECT DISTINCT ship_id FROM doctrines"))]
+            lead_ship_ids = [row[0] for row in conn.execute(text("SELECT DISTINCT lead_ship FROM lead_ships"))]
+    except Exception as e:
+        logger.error(f"Error getting doctrine ships for image prefetch: {e}")
+        return
+    finally:
+        if owned:
+            engine.dispose()
+    images.prefetch(ship_ids, "render", 64)
+    images.prefetch(lead_ship_ids, "render", 256)
+    logger.info(f"Queued image prefetch for {len(ship_ids)} doctrine ships and {len(lead_ship_ids)} lead ships")
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,189 @@
+import datetime
+import json
+import threading
+from email.utils import parsedate_to_datetime
+
+import numpy as np
+import requests
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert
+
+from build_cost_cache import purge_stale_costs
+from build_cost_models import IndustryIndex, IndustryIndexState
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+build_cost_url = "sqlite:///build_cost.db"
+industry_systems_url = "https://esi.evetech.net/latest/industry/systems/?datasource=tranquility"
+user_agent = "WC Markets v0.52 (admin contact: Orthel.Toralen@gmail.com; +https://github.com/OrthelT/wcmkts_new"
+activities = [
+    "manufacturing",
+    "researching_time_efficiency",
+    "researching_material_efficiency",
+    "copying",
+    "invention",
+    "reaction",
+]
+
+
+def parse_http_date(value: str | None) -> datetime.datetime | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).astimezone(datetime.UTC)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_systems(systems_data: list[dict]) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """Parse the ESI payload into solar system ids and one cost index array per activity."""
+    system_ids = np.fromiter((system['solar_system_id'] for system in systems_data), dtype=np.int64, count=len(systems_data))
+    columns = {activity: np.full(len(systems_data), np.nan) for activity in activities}
+    for i, system in enumerate(systems_data):
+        for activity_info in system['cost_indices']:
+            column = columns.get(activity_info['activity'])
+            if column is not None:
+                column[i] = activity_info['cost_index']
+    return system_ids, columns
+
+
+class IndustryIndexRefresher:
+    """Process-wide refresher for the ESI industry system cost indexes.
+
+    ETag, Last-Modified and Expires are kept in the industry_index_state table,
+    so a request is only made once the stored payload has expired, and then as
+    a conditional request. Concurrent callers share a single refresh.
+    """
+
+    def __init__(self, url: str = industry_systems_url, db_url: str = build_cost_url, timeout: float = 30):
+        self.url = url
+        self.timeout = timeout
+        self.engine = sa.create_engine(db_url)
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._state = None
+        self._tables_ready = False
+
+    def _ensure_tables(self, conn):
+        if self._tables_ready:
+            return
+        inspector = sa.inspect(conn)
+        if inspector.has_table(IndustryIndex.__tablename__):
+            pk = inspector.get_pk_constraint(IndustryIndex.__tablename__)["constrained_columns"]
+            if pk != ["solar_system_id"]:
+                # older versions wrote the table with to_sql, which has no primary key;
+                # copy its rows into a keyed table so the indexes survive until the next refresh
+                logger.info("Recreating industry_index with a primary key")
+                table = IndustryIndex.__tablename__
+                old_columns = {column["name"] for column in inspector.get_columns(table)}
+                columns = ", ".join(f'"{c}"' for c in ["solar_system_id", *activities] if c in old_columns)
+                conn.exec_driver_sql(f'ALTER TABLE "{table}" RENAME TO "{table}_old"')
+                IndustryIndex.__table__.create(conn)
+                conn.exec_driver_sql(f'INSERT OR REPLACE INTO "{table}" ({columns}) SELECT {columns} FROM "{table}_old" WHERE solar_system_id IS NOT NULL ORDER BY rowid')
+                conn.exec_driver_sql(f'DROP TABLE "{table}_old"')
+        IndustryIndex.__table__.create(conn, checkfirst=True)
+        IndustryIndexState.__table__.create(conn, checkfirst=True)
+        self._tables_ready = True
+
+    def get_state(self) -> dict:
+        """Stored response headers for the url (empty if never fetched)."""
+        with self._state_lock:
+            if self._state is None:
+                with self.engine.begin() as conn:
+                    self._ensure_tables(conn)
+                    row = conn.execute(sa.select(IndustryIndexState).where(IndustryIndexState.url == self.url)).mappings().first()
+                self._state = dict(row) if row else {}
+            return self._state
+
+    def index_version(self) -> str | None:
+        """Last-Modified of the stored indexes, used to version cached build costs."""
+        return self.get_state().get("last_modified")
+
+    def last_modified(self) -> datetime.datetime | None:
+        version = self.index_version()
+        return datetime.datetime.fromisoformat(version) if version else None
+
+    def is_expired(self, now: datetime.datetime | None = None) -> bool:
+        expires = self.get_state().get("expires")
+        if not expires:
+            return True
+        now = now or datetime.datetime.now().astimezone(datetime.UTC)
+        return datetime.datetime.fromisoformat(expires) <= now
+
+    def refresh(self, force: bool = False) -> bool:
+        """Refresh the indexes if expired; returns True if the table changed."""
+        if not force and not self.is_expired():
+            return False
+        with self._lock:
+            # another caller may have refreshed while we waited for the lock
+            if not force and not self.is_expired():
+                return False
+            return self._fetch()
+
+    def _fetch(self) -> bool:
+        state = self.get_state()
+        headers = {"Accept": "application/json", "User-Agent": user_agent}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+
+        response = requests.get(self.url, headers=headers, timeout=self.timeout)
+        now = datetime.datetime.now().astimezone(datetime.UTC)
+        expires = parse_http_date(response.headers.get("Expires"))
+
+        if response.status_code == 304:
+            logger.info(f"Industry index current, next update: {expires}")
+            self._save_state(etag=state.get("etag"), last_modified=state.get("last_modified"), expires=expires, checked_at=now)
+            return False
+        response.raise_for_status()
+
+        system_ids, columns = parse_systems(response.json())
+        last_modified = parse_http_date(response.headers.get("Last-Modified")) or now
+        with self.engine.begin() as conn:
+            self._upsert(conn, system_ids, columns)
+        self._save_state(etag=response.headers.get("ETag"), last_modified=last_modified.isoformat(), expires=expires, checked_at=now)
+        purge_stale_costs(last_modified.isoformat())
+        logger.info(f"Industry index updated: {len(system_ids)} systems, last modified {last_modified}")
+        return True
+
+    def _upsert(self, conn, system_ids: np.ndarray, columns: dict[str, np.ndarray]):
+        values = np.column_stack([columns[activity] for activity in activities]).astype(object)
+        values[np.isnan(values.astype(float))] = None
+        rows = [
+            {"solar_system_id": int(system_id), **dict(zip(activities, row))}
+            for system_id, row in zip(system_ids.tolist(), values.tolist())
+        ]
+        table = IndustryIndex.__table__
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.solar_system_id],
+            set_={activity: stmt.excluded[activity] for activity in activities},
+        )
+        if rows:
+            conn.execute(stmt, rows)
+        conn.execute(
+            sa.text("DELETE FROM industry_index WHERE solar_system_id NOT IN (SELECT value FROM json_each(:ids))"),
+            {"ids": json.dumps(system_ids.tolist())},
+        )
+
+    def _save_state(self, etag: str | None, last_modified: str | None, expires: datetime.datetime | None, checked_at: datetime.datetime):
+        state = {
+            "url": self.url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires": expires.isoformat() if expires else None,
+            "checked_at": checked_at.isoformat(),
+        }
+        stmt = insert(IndustryIndexState.__table__).values(**state)
+        stmt = stmt.on_conflict_do_update(index_elements=["url"], set_={k: v for k, v in state.items() if k != "url"})
+        with self._state_lock, self.engine.begin() as conn:
+            conn.execute(stmt)
+            self._state = state
+
+
+industry_index = IndustryIndexRefresher()
+
+
+if __name__ == "__main__":
+    industry_index.refresh(force=True)
+    print(f"Industry index version: {industry_index.index_version()}")
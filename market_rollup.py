@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+sde_url = "sqlite:///sde.db"
+levels = ("type", "group", "category", "all")
+
+orders_query = """
+    SELECT type_id, is_buy_order, price, volume_remain
+    FROM marketorders
+"""
+
+types_query = """
+    SELECT it.typeID as type_id, it.typeName as type_name, ig.groupID as group_id, ig.groupName as group_name,
+           ic.categoryID as category_id, ic.categoryName as category_name
+    FROM invTypes it
+    JOIN invGroups ig ON it.groupID = ig.groupID
+    JOIN invCategories ic ON ig.categoryID = ic.categoryID
+"""
+
+rollup_columns = ["level", "key", "name", "side", "orders", "volume", "value", "min_price", "max_price"]
+
+
+def rollup(orders: pd.DataFrame, types: pd.DataFrame) -> pd.DataFrame:
+    """Order count, volume, value and price range per side at type, group, category and whole-market level.
+
+    Types missing from the SDE are kept at type level and in the market total.
+    """
+    orders = orders.assign(
+        side=np.where(orders["is_buy_order"].astype(bool), "buy", "sell"),
+        value=orders["price"] * orders["volume_remain"],
+    ).merge(types, on="type_id", how="left")
+    orders["all_id"] = 0
+    orders["all_name"] = "All"
+
+    aggregations = {
+        "orders": ("price", "size"),
+        "volume": ("volume_remain", "sum"),
+        "value": ("value", "sum"),
+        "min_price": ("price", "min"),
+        "max_price": ("price", "max"),
+    }
+    frames = []
+    for level in levels:
+        key, name = f"{level}_id", f"{level}_name"
+        grouped = orders.groupby([key, "side"], dropna=True).agg(name=(name, "first"), **aggregations).reset_index()
+        frames.append(grouped.rename(columns={key: "key"}).assign(level=level))
+    df = pd.concat(frames, ignore_index=True)
+    df["key"] = df["key"].astype(np.int64)
+    return df[rollup_columns]
+
+
+if __name__ == "__main__":
+    pass
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Date, Float, Boolean, create_engine, DateTime, text
+from sqlalchemy import Column, Integer, MetaData, String, Date, Float, Boolean, create_engine, DateTime, insert, text
 from datetime import date, datetime, timedelta
+import numpy as np
 import pandas as pd
 import json
 
@@ -8,6 +9,17 @@ from sqlalchemy.orm import declarative_base, sessionmaker
 
 local_db = "sqlite:///market_data.db"
 market_latest = "/mnt/c/Users/User/PycharmProjects/eveESO/output/brazil/new_orders.csv"
+load_chunksize = 50_000
+
+# CSV columns loaded into marketOrders; issued is parsed separately
+order_dtypes = {
+    "order_id": "int64",
+    "is_buy_order": "bool",
+    "type_id": "int64",
+    "duration": "int64",
+    "price": "float64",
+    "volume_remain": "int64",
+}
 
 Base = declarative_base()
 
@@ -39,16 +51,42 @@ class InvType(Base):
     soundID = Column(Integer)
     graphicID = Column(Integer)
 
-def mkt_orders_to_db(df):
+def _order_chunks(source, chunksize: int):
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize][[*order_dtypes, "issued"]].astype(order_dtypes)
+        return
+    yield from pd.read_csv(source, usecols=[*order_dtypes, "issued"], dtype=order_dtypes, chunksize=chunksize)
+
+def mkt_orders_to_db(source=market_latest, chunksize: int = load_chunksize) -> int:
+    """Replace marketOrders with the orders in source (a CSV path or DataFrame); returns the row count.
+
+    The CSV is read chunksize rows at a time and inserted with executemany into
+    a staging table, which replaces marketOrders in the same transaction, so
+    memory stays bounded and readers see the old or the new orders, never a
+    partial table.
+    """
     engine = create_engine(local_db)
-    
-    Session = sessionmaker(bind=engine)
-
-    with Session.begin() as session:
-        session.query(MarketOrder).delete()
-        session.bulk_insert_mappings(MarketOrder, df.to_dict(orient="records"))
-        session.commit()
-        session.close()
+    staging = MarketOrder.__table__.to_metadata(MetaData(), name=f"{MarketOrder.__tablename__}_new")
+    columns = [column.name for column in staging.columns]
+    rows = 0
+
+    with engine.begin() as conn:
+        staging.drop(conn, checkfirst=True)
+        staging.create(conn)
+        stmt = insert(staging).compile(conn)
+        for chunk in _order_chunks(source, chunksize):
+            chunk = chunk.assign(
+                is_buy_order=chunk["is_buy_order"].astype(int),
+                # the format SQLAlchemy's DateTime stores; numpy formats far faster than .dt.strftime
+                issued=np.char.replace(np.datetime_as_string(pd.to_datetime(chunk["issued"], utc=True).dt.tz_localize(None).to_numpy(), unit="us"), "T", " "),
+            )
+            conn.exec_driver_sql(str(stmt), list(chunk[columns].itertuples(index=False, name=None)))
+            rows += len(chunk)
+        MarketOrder.__table__.drop(conn, checkfirst=True)
+        conn.exec_driver_sql(f'ALTER TABLE "{staging.name}" RENAME TO "{MarketOrder.__tablename__}"')
+    engine.dispose()
+    return rows
 
 def get_expiring_orders(df:pd.DataFrame):
     df = df[df.is_buy_order == False]
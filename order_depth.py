@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+depth_fractions = (0.05, 0.10)
+
+orders_query = """
+    SELECT type_id, type_name, is_buy_order, price, volume_remain
+    FROM marketorders
+"""
+
+
+def side_depth(type_ids: np.ndarray, keys: np.ndarray, volumes: np.ndarray, fractions=depth_fractions) -> dict[str, np.ndarray]:
+    """Best key, order count, total volume and volume within each fraction of the best key, per type.
+
+    keys are prices for sell orders and negated prices for buy orders, so the
+    best order is always the smallest key. Orders are sorted once; the volume
+    within a fraction is a difference of cumulative sums, with the cut-off
+    found by searchsorted over keys normalised into [group, group + 1).
+    """
+    order = np.lexsort((keys, type_ids))
+    type_ids, keys, volumes = type_ids[order], keys[order], volumes[order]
+    groups, starts, counts = np.unique(type_ids, return_index=True, return_counts=True)
+    ends = starts + counts
+    cumulative = np.concatenate([[0], np.cumsum(volumes)])
+
+    best = keys[starts]
+    worst = keys[ends - 1]
+    group = np.repeat(np.arange(len(groups)), counts)
+    span = (worst - best) + np.abs(best) * max(fractions) + 1
+    normalised = group + (keys - best[group]) / span[group]
+
+    result = {
+        "type_id": groups,
+        "best": best,
+        "orders": counts,
+        "volume": cumulative[ends] - cumulative[starts],
+    }
+    for fraction in fractions:
+        limit = np.arange(len(groups)) + (np.abs(best) * fraction) / span
+        cut = np.searchsorted(normalised, limit, side="right")
+        result[fraction] = cumulative[cut] - cumulative[starts]
+    return result
+
+
+def depth_metrics(orders: pd.DataFrame, fractions=depth_fractions) -> pd.DataFrame:
+    """Best bid/ask, spread and the volume within each fraction of the best price, one row per type."""
+    names = orders.drop_duplicates("type_id").set_index("type_id")["type_name"]
+    frames = []
+    for side, is_buy, sign in (("ask", 0, 1.0), ("bid", 1, -1.0)):
+        side_orders = orders[orders["is_buy_order"] == is_buy]
+        depth = side_depth(
+            side_orders["type_id"].to_numpy(dtype=np.int64),
+            side_orders["price"].to_numpy(dtype=float) * sign,
+            side_orders["volume_remain"].to_numpy(dtype=float),
+            fractions,
+        )
+        frame = pd.DataFrame({
+            "type_id": depth["type_id"],
+            f"best_{side}": depth["best"] * sign,
+            f"{side}_orders": depth["orders"],
+            f"{side}_volume": depth["volume"],
+            **{f"{side}_volume_{round(fraction * 100)}pct": depth[fraction] for fraction in fractions},
+        })
+        frames.append(frame.set_index("type_id"))
+
+    df = frames[0].join(frames[1], how="outer")
+    df["spread"] = df["best_ask"] - df["best_bid"]
+    df["spread_pct"] = df["spread"] / df["best_ask"] * 100
+    df.insert(0, "type_name", names.reindex(df.index))
+    for column in ("ask_orders", "bid_orders"):
+        df[column] = df[column].fillna(0).astype(int)
+    return df.reset_index()
+
+
+if __name__ == "__main__":
+    pass
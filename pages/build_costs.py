@@ -1,27 +1,28 @@
 import os
 import sys
 from dataclasses import dataclass
-from typing import Sequence, Tuple
 import pandas as pd
-import sqlalchemy as sa
-import sqlalchemy.orm as orm
 import streamlit as st
 import pathlib
 import requests
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from build_cost_models import Structure, Rig, IndustryIndex
 from logging_config import setup_logging
 from millify import millify
 from db_handler import get_groups_for_category, get_types_for_group, get_4H_price
 from db_utils import update_industry_index
+from industry_index import industry_index
+from build_cost_calculator import get_local_costs
+from build_cost_cache import get_cached_costs, store_costs
+from build_cost_catalog import BuildCostCatalog, get_catalog, load_catalog
+from price_feed import jita_prices
+from image_cache import type_image
+from presentation import number_config, highlight, COMPACT
+from build_sheet import build_sheet, fetch_structure_costs, load_build_sheet, save_build_sheet, sheet_key, sheet_columns
+from build_cost_sweep import parse_values, sweep_grid, sweep_costs, cost_surface, create_sweep_chart
 import datetime
 
-build_cost_db = os.path.join("build_cost.db")
-build_cost_url = f"sqlite:///{build_cost_db}"
-valid_structures = [35827, 35825, 35826]
-
 logger = setup_logging(__name__)
 
 @dataclass
@@ -32,104 +33,14 @@ class JobQuery:
     te: int
     security: str = "NULL_SEC"
     system_cost_bonus: float = 0.0
-    
+    item_id: int | None = None
+    catalog: BuildCostCatalog | None = None
 
     def __post_init__(self):
-        self.item_id = get_type_id(self.item)
-
-    def yield_urls(self):
-        """Generator that yields URLs for each structure."""
-        structure_generator = yield_structure()
-        for structure in structure_generator:
-            yield self.construct_url(structure), structure.structure
-
-
-    def construct_url(self, structure):
-        rigs = [structure.rig_1, structure.rig_2, structure.rig_3]
-        clean_rigs = [rig for rig in rigs if rig != "0" and rig is not None]
-
-        valid_rigs = get_valid_rigs()
-        system_id = structure.system_id
-        system_cost_index = get_manufacturing_cost_index(system_id)
-    
-        clean_rigs = [rig for rig in clean_rigs if rig in valid_rigs]
-        clean_rig_ids = [valid_rigs[rig] for rig in clean_rigs]
-        tax = structure.tax
-
-        formatted_rigs = [f"&rig_id={str(rig)}" for rig in clean_rig_ids]
-        rigs = "".join(formatted_rigs)
-        url = f"https://api.everef.net/v1/industry/cost?product_id={self.item_id}&runs={self.runs}&me={self.me}&te={self.te}&structure_type_id={structure.structure_type_id}&security={self.security}{rigs}&system_cost_bonus={self.system_cost_bonus}&manufacturing_cost={system_cost_index}&facility_tax={tax}"
-        return url
-
-def get_structure_data():
-    structure_list = []
-    engine = sa.create_engine(build_cost_url)
-    with engine.connect() as conn:
-        res = conn.execute(sa.select(Structure))
-        structures = res.fetchall()
-        for structure in structures:
-            structure_list.append(structure)
-    return structure_list   
-
-def get_valid_rigs():
-    rigs = fetch_rigs()
-    invalid_rigs = [46640, 46641, 46496, 46497, 46634, 46640, 46641]
-    valid_rigs = {}
-    for k, v in rigs.items():
-        if v not in invalid_rigs:
-            valid_rigs[k] = v
-    return valid_rigs
-
-
-def fetch_rigs():
-    engine = sa.create_engine(build_cost_url)
-    with engine.connect() as conn:
-        res = conn.execute(sa.text("SELECT type_name, type_id FROM rigs"))
-        res = res.fetchall()
-        type_names = [item[0] for item in res]
-        type_ids = [item[1] for item in res]
-
-        types_dict = {}
-        for name, id in zip(type_names, type_ids):
-            types_dict[name] = id
-        return types_dict
-    
-def fetch_rig_id(rig_name: str | None):
-    if rig_name is None:
-        return None
-    elif rig_name == str(0):
-        logger.info("Rig name is 0")
-        return None
-    else:
-        try:
-            engine = sa.create_engine(build_cost_url)
-            with orm.Session(engine) as session:
-                res = session.query(Rig).filter(Rig.type_name == rig_name).one()
-                return res.type_id
-        except Exception as e:
-            logger.error(f"Error fetching rig id for {rig_name}: {e}")
-            return None
-
-def fetch_structure_by_name(structure_name: str):
-    engine = sa.create_engine(build_cost_url)
-    with engine.connect() as conn:
-        res = conn.execute(sa.select(Structure).where(Structure.structure == structure_name))
-        structure = res.fetchall()
-        if structure is not None:
-            return structure[0]
-        else:
-            raise Exception(f"No structure found for {structure_name}")
-    
-def get_manufacturing_cost_index(system_id: int) -> float | None:
-   
-    engine = sa.create_engine(build_cost_url)
-    with engine.connect() as conn:
-        res = conn.execute(sa.select(IndustryIndex.manufacturing).where(IndustryIndex.solar_system_id == system_id))
-        index = res.scalar()
-        if index is not None:
-            return float(index)
-        else:
-            raise Exception(f"No manufacturing cost index found for {system_id}")
+        if self.item_id is None:
+            self.item_id = get_type_id(self.item)
+        if self.catalog is None:
+            self.catalog = load_catalog("uncached")
 
 def get_type_id(type_name: str) -> int:
     url = f"https://www.fuzzwork.co.uk/api/typeid.php?typename={type_name}"
@@ -141,91 +52,31 @@ def get_type_id(type_name: str) -> int:
         logger.error(f"Error fetching: {response.status_code}")
         raise Exception(f"Error fetching type id for {type_name}: {response.status_code}")
 
-def get_system_id(system_name: str) -> int:
-    engine = sa.create_engine(build_cost_url)
-    stmt = sa.select(Structure.system_id).where(Structure.system == system_name)
-    with engine.connect() as conn:
-        res = conn.execute(stmt)
-        system_id = res.scalar()
-        if system_id is not None:
-            return system_id
-        else:
-            raise Exception(f"No system id found for {system_name}")
-
 def get_costs(job: JobQuery):
-    url_generator = job.yield_urls()
-    results = {}
-    structures = get_all_structures()
-    progress_bar = st.progress(0, text=f"Fetching data from {len(structures)} structures...")
-    # Get the longest structure name for padding
-    max_length = max(len(str(s.structure)) for s in structures)
-    
-    for i in range(len(structures)):
-        url, structure_name = next(url_generator)
-        # Pad the line with spaces to ensure it's at least as long as the previous line
-        status = f"\rFetching {i+1} of {len(structures)} structures: {structure_name}"
-        progress_bar.progress(i/len(structures), text=status)
-
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            try:
-                data2 = data['manufacturing'][str(job.item_id)]
-            except KeyError as e:
-                print(e)
-                print(f"No data found for {job.item_id}")
-                logger.error(f"Error: {e} No data found for {job.item_id}")
-                return None
-        else:
-            logger.error(f"Error fetching data for {structure_name}: {response.status_code}")
-            logger.error(f"Error: {response.text}")
-            continue
-
-        results[structure_name] = {
-            "total_cost": data2['total_cost'],
-            "total_cost_per_unit": data2['total_cost_per_unit'],
-            "total_material_cost": data2['total_material_cost'],
-            "facility_tax": data2['facility_tax'],
-            "scc_surcharge": data2['scc_surcharge'],
-            "system_cost_index": data2['system_cost_index'],
-            "total_job_cost": data2['total_job_cost']
-        }
+    structures = job.catalog.structures
+    index_version = job.catalog.index_version
+    results = get_cached_costs(job.item_id, job.runs, job.me, job.te, index_version, structures)
+    missing = [s for s in structures if s.structure not in results]
+    if not missing:
+        logger.info(f"Serving {len(results)} cached results for {job.item_id}")
+        return results
+
+    progress_bar = st.progress(0, text=f"Fetching data for {len(missing)} structures...")
+    new_results = fetch_structure_costs(job.item_id, job.runs, job.me, job.te, job.catalog, missing, job.security,
+        progress=lambda done, total: progress_bar.progress(done / total, text=f"Fetched {done} of {total} unique structure setups"))
+    progress_bar.empty()
+    store_costs(job.item_id, job.runs, job.me, job.te, index_version, missing, new_results)
+    results.update(new_results)
+    if not results:
+        logger.error(f"No data found for {job.item_id}")
+        return None
     return results
 
-def get_all_structures() -> Sequence[sa.Row[Tuple[Structure]]]:
-    engine = sa.create_engine(build_cost_url)
-    with engine.connect() as conn:
-        res = conn.execute(sa.select(Structure).filter(Structure.structure_type_id.in_(valid_structures)))
-        structures = res.fetchall()
-        return structures
-    
-def yield_structure():
-    structures = get_all_structures()
-    for structure in structures:
-        yield structure
-
-def get_jita_price(type_id: int) -> float:
-    url = f"https://market.fuzzwork.co.uk/aggregates/?region=10000002&types={type_id}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        print(data)
-        return data[str(type_id)]['sell']['percentile']
-    else:
-        logger.error(f"Error fetching price for {type_id}: {response.status_code}")
-        raise Exception(f"Error fetching price for {type_id}: {response.status_code}")
-
-def filter_commodity_groups():
-    df = pd.read_csv("build_catagories.csv")
-
-def is_valid_image_url(url: str) -> bool:
-    """Check if the URL returns a valid image."""
-    try:
-        response = requests.head(url)
-        return response.status_code == 200 and 'image' in response.headers.get('content-type', '')
-    except Exception as e:
-        logger.error(f"Error checking image URL {url}: {e}")
-        return False
+def get_jita_price(type_id: int) -> float | None:
+    price = jita_prices.get_price(type_id)
+    if price is None:
+        logger.error(f"No Jita price found for {type_id}")
+    return price
 
 def display_data(df: pd.DataFrame, selected_structure: str | None = None):
     if selected_structure:
@@ -233,80 +84,40 @@ def display_data(df: pd.DataFrame, selected_structure: str | None = None):
         selected_total_cost = selected_structure_df['total_cost'].values[0]
         selected_total_cost_per_unit = selected_structure_df['total_cost_per_unit'].values[0]
         st.markdown(f"**Selected structure:** <span style='color: orange;'>{selected_structure}</span> <br>    *Total cost:* <span style='color: orange;'>{millify(selected_total_cost, precision=2)}</span> <br>    *Cost per unit:* <span style='color: orange;'>{millify(selected_total_cost_per_unit, precision=2)}</span>", unsafe_allow_html=True )
-        df['comparison_cost'] = df['total_cost'].apply(lambda x: x-selected_total_cost)
-        df['comparison_cost_per_unit'] = df['total_cost_per_unit'].apply(lambda x: x-selected_total_cost_per_unit)
-        df['comparison_cost'] = df['comparison_cost'].apply(lambda x: millify(x, precision=2))
-        df['comparison_cost_per_unit'] = df['comparison_cost_per_unit'].apply(lambda x: millify(x, precision=2))
-   
-    df['total_cost'] = df['total_cost'].apply(lambda x: millify(x, precision=2))
-    df['total_cost_per_unit'] = df['total_cost_per_unit'].apply(lambda x: millify(x, precision=2))
-    df['total_material_cost'] = df['total_material_cost'].apply(lambda x: millify(x, precision=2))
-    df['facility_tax'] = df['facility_tax'].apply(lambda x: millify(x, precision=2))
-    df['scc_surcharge'] = df['scc_surcharge'].apply(lambda x: millify(x, precision=2))
-    df['total_job_cost'] = df['total_job_cost'].apply(lambda x: millify(x, precision=2))
-    df['system_cost_index'] = df['system_cost_index'].apply(lambda x: millify(x, precision=2))
+        df['comparison_cost'] = df['total_cost'] - selected_total_cost
+        df['comparison_cost_per_unit'] = df['total_cost_per_unit'] - selected_total_cost_per_unit
    
     col_order = ['total_cost', 'total_cost_per_unit', 'total_material_cost', 'total_job_cost','facility_tax', 'scc_surcharge', 'system_cost_index']
     if selected_structure:
         col_order.insert(2, 'comparison_cost')
         col_order.insert(3, 'comparison_cost_per_unit')
 
-    col_config = {
+    col_labels = {
         "total_cost": "total cost",
         "total_cost_per_unit": "cost per unit",
         "total_material_cost": "material cost",
         "facility_tax": "facility tax",
         "scc_surcharge": "scc surcharge",
         "total_job_cost": "total job cost",
-        "system_cost_index": "cost index"
+        "system_cost_index": "cost index",
+        "comparison_cost": "comparison cost",
+        "comparison_cost_per_unit": "(per unit)",
     }
-    if selected_structure:
-        col_config.update({
-            "comparison_cost": "comparison cost",
-            "comparison_cost_per_unit": "(per unit)"
-        })
+    col_config = number_config({col: COMPACT for col in col_order}, col_labels)
     df = style_dataframe(df, selected_structure)
 
     return df, col_config, col_order
 
 def style_dataframe(df: pd.DataFrame, selected_structure: str | None = None):
-    df = df.style.apply(lambda x: ['background-color: lightgreen; color: blue' if x.name == selected_structure else '' for i in x.index], axis=1)
+    df = highlight(df, [(None, df.index == selected_structure, 'background-color: lightgreen; color: blue')])
     return df
 
-def check_industry_index_expiry():
-    
-    now = datetime.datetime.now().astimezone(datetime.UTC)
-    if st.session_state.sci_expires:
-        expires = st.session_state.sci_expires
-
-        if expires < now:
-            logger.info("Industry index expired, updating")
-            try:
-                update_industry_index()
-            except Exception as e:
-                logger.error(f"Error updating industry index: {e}")
-                raise Exception(f"Error updating industry index: {e}")
-       
-    else:
-        logger.info("Industry index not in session state, updating")
-        try:
-            update_industry_index()
-        except Exception as e:
-            logger.error(f"Error updating industry index: {e}")
-            raise Exception(f"Error updating industry index: {e}")
-        
 def initialise_session_state():
     logger.info("initialising build cost tool")
-    if "sci_expires" not in st.session_state:
-        st.session_state.sci_expires = None
-    if "sci_last_modified" not in st.session_state:
-        st.session_state.sci_last_modified = None
-    if "etag" not in st.session_state:
-        st.session_state.etag = None
     try:
-        check_industry_index_expiry()
+        update_industry_index()
     except Exception as e:
-        logger.error(f"Error checking industry index expiry: {e}")
+        logger.error(f"Error updating industry index: {e}")
 
 def main():
     initialise_session_state()
@@ -326,6 +137,8 @@ def main():
     with col2:
         st.title("Build Cost Tool")
 
+    mode = st.sidebar.radio("Mode", ["Single item", "Build sheet", "Sweep"], horizontal=True, help="Build sheet costs every item in the selected group or category and ranks them by margin; Sweep costs one item over ranges of runs, ME and TE")
+
     df = pd.read_csv("build_catagories.csv")
     df = df.sort_values(by='category')
     categories = df['category'].unique().tolist()
@@ -337,107 +150,255 @@ def main():
     groups = get_groups_for_category(category_id)
     groups = groups.sort_values(by='groupName')
     group_names = groups['groupName'].unique()
-    selected_group = st.sidebar.selectbox("Select a group", group_names)
+    whole_category = mode == "Build sheet" and st.sidebar.checkbox("Whole category", help="Cost every group in the category")
+    selected_group = st.sidebar.selectbox("Select a group", group_names, disabled=whole_category)
     group_id = groups[groups['groupName'] == selected_group]['groupID'].values[0]
 
-    types_df = get_types_for_group(group_id)
-    types_df = types_df.sort_values(by='typeName')
-    type_names = types_df['typeName'].unique()
-    selected_item = st.sidebar.selectbox("Select an item", type_names)
-    type_id = types_df[types_df['typeName'] == selected_item]['typeID'].values[0]
-
-    runs = st.sidebar.number_input("Runs", min_value=1, max_value=1000000, value=1)
-    me = st.sidebar.number_input("ME", min_value=0, max_value=10, value=10)
-    te = st.sidebar.number_input("TE", min_value=0, max_value=20, value=10)
-    
-    url = f"https://images.evetech.net/types/{type_id}/render?size=256"
-    alt_url = f"https://images.evetech.net/types/{type_id}/icon"
-
+    if mode != "Build sheet":
+        types_df = get_types_for_group(group_id)
+        types_df = types_df.sort_values(by='typeName')
+        type_names = types_df['typeName'].unique()
+        selected_item = st.sidebar.selectbox("Select an item", type_names)
+        type_id = types_df[types_df['typeName'] == selected_item]['typeID'].values[0]
+
+    if mode == "Sweep":
+        range_help = "Comma-separated values or ranges, e.g. 1,5,10-50:10"
+        runs_text = st.sidebar.text_input("Runs", "1,5,10,20,50", help=range_help)
+        me_text = st.sidebar.text_input("ME", "0-10:2", help=range_help)
+        te_text = st.sidebar.text_input("TE", "10", help=range_help)
+    else:
+        runs = st.sidebar.number_input("Runs", min_value=1, max_value=1000000, value=1)
+        me = st.sidebar.number_input("ME", min_value=0, max_value=10, value=10)
+        te = st.sidebar.number_input("TE", min_value=0, max_value=20, value=10)
+    cost_source = st.sidebar.radio("Cost source", ["everef API", "Local calculator"], help="The local calculator uses blueprint, rig and cost index data stored locally and works offline")
+
+    index_version = industry_index.index_version()
+    if index_version:
+        catalog = get_catalog(index_version)
+    else:
+        catalog = load_catalog("uncached")
+    structure_names = sorted(catalog.structure_names)
 
-    all_structures = get_all_structures()
-    structure_names = [structure.structure for structure in all_structures]
-    structure_names = sorted(structure_names)
+    if mode == "Build sheet":
+        if whole_category:
+            display_build_sheet(sorted({int(g) for g in groups["groupID"]}), selected_category, runs, me, te, cost_source, catalog)
+        else:
+            display_build_sheet([int(group_id)], selected_group, runs, me, te, cost_source, catalog)
+        return
 
+    if mode == "Sweep":
+        try:
+            runs_values = parse_values(runs_text, 1, 1000000)
+            me_values = parse_values(me_text, 0, 10)
+            te_values = parse_values(te_text, 0, 20)
+        except ValueError as e:
+            st.error(f"Invalid sweep range: {e}")
+            return
+        display_sweep(int(type_id), selected_item, runs_values, me_values, te_values, cost_source, catalog)
+        return
+
+    # only ships have renders; everything else uses its icon
+    url = type_image(type_id, "render", 256) if category_id == 6 else type_image(type_id, "icon", 64)
 
     with st.sidebar.expander("Select a structure to compare (optional)"):
         selected_structure = st.selectbox("Structures:", structure_names, index=None, placeholder="All Structures")
 
-    if st.session_state.sci_last_modified:
+    sci_last_modified = industry_index.last_modified()
+    if sci_last_modified:
         st.sidebar.markdown("---")
-        st.sidebar.markdown(f"*Industry indexes last updated: {st.session_state.sci_last_modified.strftime('%Y-%m-%d %H:%M:%S UTC')}*")
+        st.sidebar.markdown(f"*Industry indexes last updated: {sci_last_modified.strftime('%Y-%m-%d %H:%M:%S UTC')}*")
     else:
-        st.rerun()
+        st.sidebar.warning("Industry indexes are not available yet")
+
+    job_params = {"type_id": int(type_id), "runs": runs, "me": me, "te": te, "cost_source": cost_source}
 
     if st.button("Calculate"):
         vale_price = get_4H_price(type_id)
         jita_price = get_jita_price(type_id)
-        if jita_price:
-            jita_price = float(jita_price)
-        else:
-            st.write("No Jita price data found for this item")
-            
-        if vale_price:
-            vale_price = float(vale_price)
-        else:
-            st.write("No Vale price data found for this item")
-        if jita_price and vale_price:
-            vale_jita_price_ratio = ((vale_price-jita_price) / jita_price) * 100
-        else:
-            vale_jita_price_ratio = 0
-
-        col1, col2 = st.columns([0.2, 0.8])
-        with col1:
-            if is_valid_image_url(url):
-                st.image(url)
-            else:
-                st.image(alt_url, use_container_width=True)
-        with col2:
-            st.header(f"Calculating cost for {selected_item}", divider="violet")
-            st.write(f"Calculating cost for {selected_item} with {runs} runs, {me} ME, {te} TE (type_id: {type_id})")
-
-            if vale_price:
-                st.markdown(f"**4-HWWF price:** <span style='color: orange;'>{millify(vale_price, precision=2)} ISK</span> ({vale_jita_price_ratio:.2f}% Jita) <br> \
-                **Jita price:** <span style='color: orange;'>{millify(jita_price, precision=2)} ISK</span>", unsafe_allow_html=True)
-            elif jita_price:
-                st.markdown(f"**Jita price:** <span style='color: orange;'>{millify(jita_price, precision=2)} ISK</span>", unsafe_allow_html=True)
-            else:
-                st.write("No price data found for this item")
 
         job = JobQuery(item=selected_item, 
             runs=runs, 
             me=me, 
-            te=te)
+            te=te,
+            item_id=int(type_id),
+            catalog=catalog)
         
-        results = get_costs(job)
-
-        if results is not None:
-            
-            df = pd.DataFrame.from_dict(results, orient='index')
-            df = df.sort_values(by='total_cost', ascending=True)
-            low_cost = df['total_cost_per_unit'].min()
-            low_cost = float(low_cost)
-
-            if vale_price:
-                profit_per_unit_vale = vale_price - low_cost
-                percent_profit_vale = ((vale_price - low_cost) / vale_price) * 100
-                st.metric(label="Profit per unit Vale", value=f"{millify(profit_per_unit_vale, precision=2)} ISK ({percent_profit_vale:.2f}%)")
-            else:
-                st.write("No Vale price data found for this item")
-            if jita_price:
-                profit_per_unit_jita = jita_price - low_cost
-                percent_profit_jita = ((jita_price - low_cost) / jita_price) * 100
-                st.metric(label="Profit per unit Jita", value=f"{millify(profit_per_unit_jita, precision=2)} ISK ({percent_profit_jita:.2f}%)")
-            else:
-                st.write("No Jita price data found for this item")
-            
-            display_df, col_config, col_order = display_data(df, selected_structure)
-
-            st.dataframe(display_df, column_config=col_config, column_order=col_order)
-
-
+        if cost_source == "Local calculator":
+            results = get_local_costs(job.item_id, job.runs, job.me, job.security, job.system_cost_bonus, catalog.structure_frame())
         else:
+            results = get_costs(job)
+
+        if results is None:
             logger.error(f"No results found for {selected_item}")
             raise Exception(f"No results found for {selected_item}")
+
+        # keep the results so display-only changes (e.g. the comparison structure) don't recompute
+        st.session_state.build_cost_results = {
+            "params": job_params,
+            "item": selected_item,
+            "vale_price": vale_price,
+            "jita_price": jita_price,
+            "results": results,
+        }
+
+    calculation = st.session_state.get("build_cost_results")
+    if calculation and calculation["params"] == job_params:
+        display_results(calculation, url, selected_structure)
+
+
+def display_build_sheet(group_ids: list[int], name: str, runs: int, me: int, te: int, cost_source: str, catalog: BuildCostCatalog):
+    st.header(f"Build sheet: {name}", divider="violet")
+    source = "local" if cost_source == "Local calculator" else "everef"
+    top_n = None
+    if source == "everef":
+        top_n = st.number_input("Structures to query per item (best N by local estimate, 0 for all)", min_value=0, max_value=len(catalog.structures), value=5)
+        top_n = top_n or None
+    key = sheet_key(group_ids, runs, me, te, source, top_n, catalog.index_version)
+
+    sheet = load_build_sheet(key)
+    if st.button("Build sheet" if sheet is None else "Rebuild sheet"):
+        progress_bar = st.progress(0, text="Costing items...")
+        sheet = build_sheet(group_ids, runs, me, te, catalog, source, top_n,
+            progress=lambda done, total: progress_bar.progress(done / total, text=f"Costed {done} of {total} items"))
+        progress_bar.empty()
+        save_build_sheet(sheet, key)
+
+    if sheet is None:
+        st.write(f"Cost every item in {name} with {runs} runs, {me} ME, {te} TE and rank them by margin.")
+        return
+    if sheet.empty:
+        st.warning(f"No items could be costed in {name}")
+        return
+
+    st.dataframe(
+        sheet[sheet_columns],
+        hide_index=True,
+        column_config={
+            "type_id": st.column_config.Column("Type ID"),
+            "type_name": st.column_config.Column("Item"),
+            "best_structure": st.column_config.Column("Best structure"),
+            "cost_per_unit": st.column_config.NumberColumn("Cost per unit", format="localized"),
+            "structures_costed": st.column_config.NumberColumn("Structures"),
+            "price_4H": st.column_config.NumberColumn("4-HWWF price", format="localized"),
+            "profit_4H": st.column_config.NumberColumn("4-HWWF profit", format="localized"),
+            "margin_4H": st.column_config.NumberColumn("4-HWWF margin %", format="%.1f"),
+            "price_jita": st.column_config.NumberColumn("Jita price", format="localized"),
+            "profit_jita": st.column_config.NumberColumn("Jita profit", format="localized"),
+            "margin_jita": st.column_config.NumberColumn("Jita margin %", format="%.1f"),
+        },
+    )
+    if "created_at" in sheet.columns:
+        st.caption(f"Built {sheet['created_at'].iloc[0]}")
+
+
+def display_sweep(type_id: int, item_name: str, runs_values: list[int], me_values: list[int], te_values: list[int], cost_source: str, catalog: BuildCostCatalog):
+    st.header(f"Sweep: {item_name}", divider="violet")
+    source = "local" if cost_source == "Local calculator" else "everef"
+    top_n = None
+    if source == "everef":
+        top_n = st.number_input("Structures to query per job (best N by local estimate, 0 for all)", min_value=0, max_value=len(catalog.structures), value=3)
+        top_n = top_n or None
+    grid_size = len(sweep_grid(runs_values, me_values, te_values))
+    sweep_params = {"type_id": type_id, "runs": runs_values, "me": me_values, "te": te_values, "source": source, "top_n": top_n, "index_version": catalog.index_version}
+
+    st.write(f"{grid_size} combinations of runs {runs_values}, ME {me_values}, TE {te_values}")
+    if st.button("Run sweep"):
+        progress_bar = st.progress(0, text="Costing jobs...")
+        try:
+            df = sweep_costs(type_id, runs_values, me_values, te_values, catalog, source, top_n,
+                progress=lambda done, total: progress_bar.progress(done / total, text=f"Costed {done} of {total} jobs"))
+        except ValueError as e:
+            st.error(str(e))
+            return
+        finally:
+            progress_bar.empty()
+        st.session_state.build_cost_sweep = {"params": sweep_params, "results": df}
+
+    sweep = st.session_state.get("build_cost_sweep")
+    if not sweep or sweep["params"] != sweep_params:
+        return
+    df = sweep["results"]
+    if df.empty:
+        st.warning("No costs found for this sweep")
+        return
+
+    structures = sorted(df["structure"].unique())
+    structure = st.selectbox("Structure", structures, index=None, placeholder="Cheapest structure")
+    st.plotly_chart(create_sweep_chart(df, structure), use_container_width=True)
+
+    surface = cost_surface(df, structure)
+    surface.columns = [f"ME {me}" for me in surface.columns]
+    st.dataframe(surface, column_config=number_config({col: COMPACT for col in surface.columns}))
+
+    with st.expander("All results"):
+        st.dataframe(df, hide_index=True, column_config=number_config({
+            "total_cost": COMPACT,
+            "total_cost_per_unit": COMPACT,
+            "total_material_cost": COMPACT,
+            "total_job_cost": COMPACT,
+        }))
+
+
+def display_results(calculation: dict, url: bytes | str, selected_structure: str | None = None):
+    selected_item = calculation["item"]
+    type_id = calculation["params"]["type_id"]
+    runs = calculation["params"]["runs"]
+    me = calculation["params"]["me"]
+    te = calculation["params"]["te"]
+    vale_price = calculation["vale_price"]
+    jita_price = calculation["jita_price"]
+    results = calculation["results"]
+
+    if jita_price:
+        jita_price = float(jita_price)
+    else:
+        st.write("No Jita price data found for this item")
+        
+    if vale_price:
+        vale_price = float(vale_price)
+    else:
+        st.write("No Vale price data found for this item")
+    if jita_price and vale_price:
+        vale_jita_price_ratio = ((vale_price-jita_price) / jita_price) * 100
+    else:
+        vale_jita_price_ratio = 0
+
+    col1, col2 = st.columns([0.2, 0.8])
+    with col1:
+        st.image(url, use_container_width=True)
+    with col2:
+        st.header(f"Calculating cost for {selected_item}", divider="violet")
+        st.write(f"Calculating cost for {selected_item} with {runs} runs, {me} ME, {te} TE (type_id: {type_id})")
+
+        if vale_price:
+            st.markdown(f"**4-HWWF price:** <span style='color: orange;'>{millify(vale_price, precision=2)} ISK</span> ({vale_jita_price_ratio:.2f}% Jita) <br> \
+            **Jita price:** <span style='color: orange;'>{millify(jita_price, precision=2)} ISK</span>", unsafe_allow_html=True)
+        elif jita_price:
+            st.markdown(f"**Jita price:** <span style='color: orange;'>{millify(jita_price, precision=2)} ISK</span>", unsafe_allow_html=True)
+        else:
+            st.write("No price data found for this item")
+
+    df = pd.DataFrame.from_dict(results, orient='index')
+    df = df.sort_values(by='total_cost', ascending=True)
+    low_cost = df['total_cost_per_unit'].min()
+    low_cost = float(low_cost)
+
+    if vale_price:
+        profit_per_unit_vale = vale_price - low_cost
+        percent_profit_vale = ((vale_price - low_cost) / vale_price) * 100
+        st.metric(label="Profit per unit Vale", value=f"{millify(profit_per_unit_vale, precision=2)} ISK ({percent_profit_vale:.2f}%)")
+    else:
+        st.write("No Vale price data found for this item")
+    if jita_price:
+        profit_per_unit_jita = jita_price - low_cost
+        percent_profit_jita = ((jita_price - low_cost) / jita_price) * 100
+        st.metric(label="Profit per unit Jita", value=f"{millify(profit_per_unit_jita, precision=2)} ISK ({percent_profit_jita:.2f}%)")
+    else:
+        st.write("No Jita price data found for this item")
+    
+    display_df, col_config, col_order = display_data(df, selected_structure)
+
+    st.dataframe(display_df, column_config=col_config, column_order=col_order)
         
         
 if __name__ == "__main__":
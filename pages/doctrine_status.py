@@ -14,7 +14,9 @@ from sqlalchemy.orm import Session
 from logging_config import setup_logging
 from db_handler import get_local_mkt_engine, get_update_time
 from doctrines import create_fit_df
+from image_cache import type_image
 import libsql_experimental as libsql
+import snapshots
 
 mktdb = "wcmkt.db"
 
@@ -24,6 +26,8 @@ logger = setup_logging(__name__, log_file="doctrine_status.log")
 @st.cache_resource(ttl=600, show_spinner="Loading libsql connection...")
 def get_libsql_connection():
     """Get a connection to the libsql database"""
+    if snapshots.deploy_mode == "worker":
+        return snapshots.connect(snapshots.market_db_path(), check_same_thread=False)
     return libsql.connect(mktdb)
 
 @st.cache_data(ttl=600, show_spinner="Loading cacheddoctrine fits...")
@@ -401,7 +405,7 @@ def main():
             with col1:
                 # Ship image and ID info
                 try:
-                    st.image(f"https://images.evetech.net/types/{row['ship_id']}/render?size=64", width=64)
+                    st.image(type_image(row['ship_id'], "render", 64), width=64)
                 except:
                     st.text("Image not available")
                 
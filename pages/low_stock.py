@@ -1,6 +1,6 @@
 import streamlit as st
 
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 import pandas as pd
 import plotly.express as px
 from sqlalchemy.orm import Session
@@ -11,7 +11,8 @@ from logging_config import setup_logging
 logger = setup_logging(__name__)
 
 # Import from the root directory
-from db_handler import get_local_mkt_engine, get_update_time, safe_format
+from db_handler import get_local_mkt_engine, get_update_time, get_stock_forecast
+from presentation import to_numeric, number_config, highlight, COUNT, DECIMAL, PRICE
 
 def get_filter_options(selected_categories=None):
     try:
@@ -45,52 +46,50 @@ def get_filter_options(selected_categories=None):
         st.error(f"Database error: {str(e)}")
         return [], []
 
+@st.cache_data(ttl=600)
 def get_market_stats(selected_categories=None, selected_items=None, max_days_remaining=None, doctrine_only=False):
-    # Start with base query for marketstats
-    query = """
-    SELECT ms.*, 
+    """One row per item, filtered in SQL; ships lists the doctrine ships using the item as "Ship (fits)"."""
+    conditions = []
+    params = {}
+    if selected_categories:
+        conditions.append("ms.category_name IN :categories")
+        params["categories"] = list(selected_categories)
+    if selected_items:
+        conditions.append("ms.type_name IN :items")
+        params["items"] = list(selected_items)
+    if doctrine_only:
+        conditions.append("d.type_id IS NOT NULL")
+    if max_days_remaining is not None:
+        conditions.append("ms.days_remaining <= :max_days_remaining")
+        params["max_days_remaining"] = max_days_remaining
+
+    # ships are aggregated once per item, in ship name order
+    query = f"""
+    SELECT ms.*,
            CASE WHEN d.type_id IS NOT NULL THEN 1 ELSE 0 END as is_doctrine,
-           d.ship_name,
-           d.fits_on_mkt
+           COALESCE(d.ships, '') as ships
     FROM marketstats ms
-    LEFT JOIN doctrines d ON ms.type_id = d.type_id
+    LEFT JOIN (
+        SELECT type_id, GROUP_CONCAT(ship_name || ' (' || CAST(fits_on_mkt AS INTEGER) || ')', ', ') as ships
+        FROM (SELECT type_id, ship_name, fits_on_mkt FROM doctrines ORDER BY type_id, ship_name)
+        GROUP BY type_id
+    ) d ON ms.type_id = d.type_id
+    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+    ORDER BY ms.days_remaining IS NULL, ms.days_remaining
     """
-    
-    # Get market stats data
+    stmt = text(query)
+    for name in ("categories", "items"):
+        if name in params:
+            stmt = stmt.bindparams(bindparam(name, expanding=True))
+
     engine = get_local_mkt_engine()
     with engine.connect() as conn:
-        df = pd.read_sql(text(query), conn)
-    
-    # Apply filters
-    if selected_categories:
-        df = df[df['category_name'].isin(selected_categories)]
-    
-    if selected_items:
-        df = df[df['type_name'].isin(selected_items)]
-        
-    if doctrine_only:
-        df = df[df['is_doctrine'] == 1]
+        df = pd.read_sql(stmt, conn, params=params)
 
-    # Apply days_remaining filter
-    if max_days_remaining is not None:
-        df = df[df['days_remaining'] <= max_days_remaining]
-    
-    # Group by item and aggregate ship information
-    if not df.empty:
-        # Create a list of ships for each item
-        ship_groups = df.groupby('type_id', group_keys=False).apply(
-            lambda x: [f"{row['ship_name']} ({int(row['fits_on_mkt'])})" 
-                      for _, row in x.iterrows() 
-                      if pd.notna(row['ship_name'])], include_groups = False
-        ).to_dict()
-        
-        # Keep only one row per item
-        df = df.drop_duplicates(subset=['type_id'])
-        
-        # Add the ships column
-        df['ships'] = df['type_id'].map(ship_groups)
-    
-    return df
+    # marketstats has one row per item, but don't rely on it
+    df = df.drop_duplicates(subset=['type_id'])
+    forecast = get_stock_forecast()[['type_id', 'stockout_date', 'stockout_early', 'urgency', 'trend']]
+    return df.merge(forecast, on='type_id', how='left')
 
 def create_days_remaining_chart(df):
     # Create bar chart for days remaining
@@ -125,7 +124,7 @@ def main():
     st.title("Winter Coalition Market Low Stock Alert")
     st.markdown("""
     This page shows items that are running low on the market. The **Days Remaining** column shows how many days of sales 
-    can be sustained by the current stock based on historical average sales. Items with fewer days remaining need attention. The **Used In Fits** column 
+    can be sustained by the current stock based on historical average sales. Items with fewer days remaining need attention. The **Stock-out** columns project when the stock runs out at recent demand, and **Urgency** ranks how soon a restock is needed. The **Used In Fits** column 
     shows the doctrine ships that use the item (if any) and the number of fits that the current market stock of the item can support.
     """)
     
@@ -170,9 +169,6 @@ def main():
     df = get_market_stats(selected_categories, None, max_days_remaining, doctrine_only)
     
     if not df.empty:
-        # Sort by days_remaining (ascending) to show most critical items first
-        df = df.sort_values('days_remaining')
-        
         # Display metrics
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -192,19 +188,15 @@ def main():
         display_df = display_df.drop(columns=['min_price', 'avg_price', 'category_id', 'group_id'])
         
         # Select and rename columns
-        columns_to_show = ['type_id', 'type_name', 'price', 'days_remaining', 'total_volume_remain', 'avg_volume', 'category_name', 'group_name', 'ships']
+        columns_to_show = ['type_id', 'type_name', 'price', 'days_remaining', 'stockout_date', 'stockout_early', 'urgency', 'trend', 'total_volume_remain', 'avg_volume', 'category_name', 'group_name', 'ships']
         display_df = display_df[columns_to_show]
         
-        numeric_formats = {
-            'total_volume_remain': '{:,.0f}',
-            'price': '{:,.2f}',
-            'days_remaining': '{:.1f}',
-            'avg_volume': '{:,.0f}',
-        }
-
-        for col, format_str in numeric_formats.items():
-            if col in display_df.columns:  # Only format if column exists
-                display_df[col] = display_df[col].apply(lambda x: safe_format(x, format_str))
+        display_df = to_numeric(display_df, {
+            'total_volume_remain': 0,
+            'price': 2,
+            'days_remaining': 1,
+            'avg_volume': 0,
+        })
         
         # Rename columns
         column_renames = {
@@ -215,51 +207,41 @@ def main():
             'group_name': 'Group', 
             'category_name': 'Category',
             'avg_volume': 'Avg Volume',
-            'ships': 'Used In Fits'
+            'ships': 'Used In Fits',
+            'stockout_date': 'Stock-out (est.)',
+            'stockout_early': 'Stock-out (earliest)',
+            'urgency': 'Urgency',
+            'trend': 'Demand Trend',
         }
         display_df = display_df.rename(columns=column_renames)
         
         # Reorder columns
-        column_order = ['Item', 'Days Remaining', 'Price', 'Volume Remaining', 'Avg Volume', 'Used In Fits', 'Category', 'Group']
+        column_order = ['Item', 'Days Remaining', 'Stock-out (est.)', 'Stock-out (earliest)', 'Urgency', 'Demand Trend', 'Price', 'Volume Remaining', 'Avg Volume', 'Used In Fits', 'Category', 'Group']
         display_df = display_df[column_order]
         
-        # Add a color indicator for critical items
-        def highlight_critical(val):
-            try:
-                val = float(val)
-                if val <= 3:
-                    return 'background-color: #fc4103'  # Light red for critical
-                elif val <= 7:
-                    return 'background-color: #c76d14'  # Light yellow for low
-                else:
-                    return ''
-            except:
-                return ''
-        
-        # Add a color indicator for doctrine items
-        def highlight_doctrine(row):
-            # Check if the "Used In Fits" column has data
-            try:
-                # Check if the value is not empty and not NaN
-                if isinstance(row['Used In Fits'], list) and len(row['Used In Fits']) > 0:
-                    # Create a list of empty strings for all columns
-                    styles = [''] * len(row)
-                    # Apply highlighting only to the "Item" column (index 0)
-                    styles[0] = 'background-color: #328fed'
-                    return styles
-            except:
-                pass
-            return [''] * len(row)
-        
-        # Apply the styling - updated from applymap to map
-        styled_df = display_df.style.map(highlight_critical, subset=['Days Remaining'])
-        
-        # Add doctrine highlighting
-        styled_df = styled_df.apply(highlight_doctrine, axis=1)
+        # Highlight critical/low days remaining and doctrine items
+        days = display_df['Days Remaining'].to_numpy()
+        in_fits = display_df['Used In Fits'].to_numpy() != ''
+        styled_df = highlight(display_df, [
+            ('Days Remaining', days <= 7, 'background-color: #c76d14'),
+            ('Days Remaining', days <= 3, 'background-color: #fc4103'),
+            ('Item', in_fits, 'background-color: #328fed'),
+            ('Urgency', display_df['Urgency'].to_numpy() == 'critical', 'background-color: #fc4103'),
+        ])
         
         # Display the dataframe
         st.subheader("Low Stock Items")
-        st.dataframe(styled_df, hide_index=True)
+        st.dataframe(styled_df, hide_index=True, column_config={
+            'Stock-out (est.)': st.column_config.DatetimeColumn(format="YYYY-MM-DD", help="When current stock runs out at the recent (exponentially weighted) daily demand"),
+            'Stock-out (earliest)': st.column_config.DatetimeColumn(format="YYYY-MM-DD", help="Early end of the 90% band, if demand runs high"),
+            'Demand Trend': st.column_config.NumberColumn(format="%.2fx", help="Last 7 days' daily volume relative to the last 30 days"),
+            **number_config({
+                'Days Remaining': DECIMAL,
+                'Price': PRICE,
+                'Volume Remaining': COUNT,
+                'Avg Volume': COUNT,
+            }),
+        })
         
         # Display charts
         st.subheader("Days Remaining by Item")
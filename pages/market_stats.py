@@ -1,19 +1,21 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from sqlalchemy import text
-from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 from db_handler import  *
-from sync_scheduler import initialize_sync_state, check_sync_status
 import datetime
 import json
 import datetime
 import millify
 from logging_config import setup_logging
-from db_utils import sync_db
+from db_utils import get_sync_scheduler
+from image_cache import type_image
+from presentation import number_config, COUNT, PRICE
+from chart_data import bin_volume, bucket_sum, downsample
+from figure_cache import figures
 
 
 # Insert centralized logging configuration
@@ -33,203 +35,119 @@ sde_auth_token = st.secrets["SDE_AUTH_TOKEN"]
 # Function to get unique categories and item names
 def get_filter_options(selected_categories=None):
     try:
-        # First get type_ids from market orders
-        mkt_query = """
-        SELECT DISTINCT type_id 
-        FROM marketorders 
-        WHERE is_buy_order = 0
-        """
         logger.info("getting filter options")
-        with Session(get_local_mkt_engine()) as session:
-            result = session.execute(text(mkt_query))
-            type_ids = [row[0] for row in result.fetchall()]
-       
-            if not type_ids:
-                return [], []
-            type_ids_str = ','.join(map(str, type_ids))
-        
-        logger.info(f"type_ids: {len(type_ids)}")
-
-        # Then get category info from SDE database
-        sde_query = f"""
-        SELECT DISTINCT it.typeName as type_name, it.typeID as type_id, it.groupID as group_id, ig.groupName as group_name, 
-               ic.categoryID as category_id, ic.categoryName as category_name
-        FROM invTypes it 
-        JOIN invGroups ig ON it.groupID = ig.groupID
-        JOIN invCategories ic ON ig.categoryID = ic.categoryID
-        WHERE it.typeID IN ({type_ids_str})
-        """
-        with Session(get_local_sde_engine()) as session:
-            result = session.execute(text(sde_query))
-            df = pd.DataFrame(result.fetchall(), 
-                              columns=['type_name', 'type_id', 'group_id', 'group_name', 'category_id', 'category_name'])
-
-            categories = sorted(df['category_name'].unique())
-            
-            if selected_categories:
-                df = df[df['category_name'].isin(selected_categories)]   
-        
+        # market types with their SDE category, joined in SQLite against the attached SDE
+        df = get_market_types()
+        logger.info(f"type_ids: {len(df)}")
+        if df.empty:
+            return [], []
+
+        categories = sorted(df['category_name'].unique())
+        if selected_categories:
+            df = df[df['category_name'].isin(selected_categories)]
         items = sorted(df['type_name'].unique())
-      
-        
+
         return categories, items
-        
 
     except Exception as e:
         st.error(f"Database error: {str(e)}")
         return [], []
 
-# Query function
-def get_market_data(show_all, selected_categories, selected_items):
-    # Get filtered_type_ids based on selected categories and items
-    filtered_type_ids = None
-    
-    if not show_all:
-        # Get type_ids for the selected categories from SDE first
-        sde_conditions = []
-        if selected_categories:
-            categories_str = ', '.join(f"'{cat}'" for cat in selected_categories)
-            sde_conditions.append(f"ic.categoryName IN ({categories_str})")
-        
-        if selected_items:
-            items_str = ', '.join(f'"{item}"' for item in selected_items)
-            sde_conditions.append(f"it.typeName IN ({items_str})")
-            
-        if sde_conditions:
-            sde_where = " AND ".join(sde_conditions)
-            sde_query = f"""
-                SELECT DISTINCT it.typeID
-                FROM invTypes it 
-                JOIN invGroups ig ON it.groupID = ig.groupID
-                JOIN invCategories ic ON ig.categoryID = ic.categoryID
-                WHERE {sde_where}
-            """
-            
-            with Session(get_local_sde_engine()) as session:
-                try:
-                    result = session.execute(text(sde_query))
-                    filtered_type_ids = [str(row[0]) for row in result.fetchall()]
-                    session.commit()
-                    session.close()
-                except Exception as e:
-                    logger.error(f"Error executing SDE query: {e}")
-
-            try:
-                logger.info(f"filtered_type_ids: {len(filtered_type_ids)}")
-                if not filtered_type_ids:
-                    return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()  # Return empty DataFrames for both values
-            except Exception as e:
-                logger.error(f"Error executing SDE query: {e}")
-    
-    # Get sell orders
-    sell_conditions = ["is_buy_order = 0"]
-    if filtered_type_ids:
-        type_ids_str = ','.join(filtered_type_ids)
-        sell_conditions.append(f"type_id IN ({type_ids_str})")
-    
-    # Build market query for sell orders
-    sell_where_clause = " AND ".join(sell_conditions)
-    sell_query = f"""
-        SELECT mo.* 
-        FROM marketorders mo
-        WHERE {sell_where_clause}
-        ORDER BY type_id
-    """
-    
-    # Get buy orders
-    buy_conditions = ["is_buy_order = 1"]
-    if filtered_type_ids:
-        type_ids_str = ','.join(filtered_type_ids)
-        buy_conditions.append(f"type_id IN ({type_ids_str})")
-    
-    # Build market query for buy orders
-    buy_where_clause = " AND ".join(buy_conditions)
-    buy_query = f"""
-        SELECT mo.* 
-        FROM marketorders mo
-        WHERE {buy_where_clause}
-        ORDER BY type_id
-    """
-    
-    stats_query = f"""
-        SELECT * FROM marketstats
-    """
-    
-    # Get market data
-    sell_df = get_mkt_data(sell_query)
-    buy_df = get_mkt_data(buy_query)
-    
-    if sell_df.empty and buy_df.empty:
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()  # Return empty DataFrames
-    
-    stats = get_stats(stats_query)
-
-    # Get all unique type_ids from both dataframes
-    all_type_ids = set()
-    if not sell_df.empty:
-        all_type_ids.update(sell_df['type_id'].unique())
-    if not buy_df.empty:
-        all_type_ids.update(buy_df['type_id'].unique())
-    
-    # Get SDE data for all type_ids in the result
-    type_ids_str = ','.join(map(str, all_type_ids))
-    sde_query = f"""
-        SELECT it.typeID as type_id, ig.groupName as group_name, ic.categoryName as category_name
-        FROM invTypes it 
-        JOIN invGroups ig ON it.groupID = ig.groupID
-        JOIN invCategories ic ON ig.categoryID = ic.categoryID
-        WHERE it.typeID IN ({type_ids_str})
-    """
-    
-    with Session(get_local_sde_engine()) as session:
-        result = session.execute(text(sde_query))
-        sde_df = pd.DataFrame(result.fetchall(), columns=['type_id', 'group_name', 'category_name'])
-        session.close()
-
-    # Merge market data with SDE data for sell orders
-    if not sell_df.empty:
-        sell_df = sell_df.merge(sde_df, on='type_id', how='left')
-        sell_df = sell_df.reset_index(drop=True)
-        # Clean up the DataFrame
-        sell_df = clean_mkt_data(sell_df)
-    
-    # Merge market data with SDE data for buy orders
-    if not buy_df.empty:
-        buy_df = buy_df.merge(sde_df, on='type_id', how='left')
-        buy_df = buy_df.reset_index(drop=True)
-        # Clean up the DataFrame
-        buy_df = clean_mkt_data(buy_df)
-    
-    logger.info(f"returning market data")
-
-    return sell_df, buy_df, stats
-
-
-def create_price_volume_chart(df):
-    # Create histogram with price bins
-    fig = px.histogram(
-        df,
-        x='price',
-        y='volume_remain',
-        histfunc='sum',  # Sum the volumes for each price point
-        nbins=50,  # Adjust number of bins as needed
-        title='Market Orders Distribution',
-        labels={
-            'price': 'Price (ISK)',
-            'volume_remain': 'Volume Available'
-        }
-    )
+def get_selection_summary(is_buy_order, category, item):
+    """Order totals for the selection: a rollup cube lookup where the selection is a cube cell, else a query."""
+    side = 'buy' if is_buy_order else 'sell'
+    if item is not None:
+        summary = lookup_rollup('type', side, (item,))
+    elif category is not None:
+        summary = lookup_rollup('category', side, (category,))
+    else:
+        summary = lookup_rollup('all', side, (0,))
+    return summary if summary is not None else get_order_summary(is_buy_order, category, item)
+
+def display_order_depth(category, item):
+    """Best prices, spread and near-best volume, precomputed after each sync."""
+    depth = get_order_depth(category, item)
+    if depth.empty:
+        return
+    if item is not None:
+        row = depth.iloc[0]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Best Ask", f"{millify.millify(row['best_ask'], precision=2)} ISK" if pd.notna(row['best_ask']) else "-")
+        col2.metric("Best Bid", f"{millify.millify(row['best_bid'], precision=2)} ISK" if pd.notna(row['best_bid']) else "-")
+        col3.metric("Spread", f"{row['spread_pct']:.1f}%" if pd.notna(row['spread_pct']) else "-")
+        col4.metric("Sell Volume within 5% / 10%", f"{millify.millify(row['ask_volume_5pct'], precision=1)} / {millify.millify(row['ask_volume_10pct'], precision=1)}" if pd.notna(row['ask_volume_5pct']) else "-")
+        return
+    with st.expander("Order Book Depth"):
+        columns = ['type_name', 'best_ask', 'best_bid', 'spread_pct', 'ask_volume_5pct', 'ask_volume_10pct', 'bid_volume_5pct', 'bid_volume_10pct']
+        st.dataframe(depth[columns], hide_index=True, column_config={
+            'type_name': st.column_config.Column("Item"),
+            **number_config({
+                'best_ask': PRICE,
+                'best_bid': PRICE,
+                'spread_pct': "%.1f%%",
+                'ask_volume_5pct': COUNT,
+                'ask_volume_10pct': COUNT,
+                'bid_volume_5pct': COUNT,
+                'bid_volume_10pct': COUNT,
+            }, {
+                'best_ask': "Best Ask",
+                'best_bid': "Best Bid",
+                'spread_pct': "Spread",
+                'ask_volume_5pct': "Sell Vol ≤5%",
+                'ask_volume_10pct': "Sell Vol ≤10%",
+                'bid_volume_5pct': "Buy Vol ≤5%",
+                'bid_volume_10pct': "Buy Vol ≤10%",
+            }),
+        })
+
+def display_order_table(key, is_buy_order, category, item):
+    """Sortable, filterable order table that only loads the page on screen."""
+    col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 1, 1])
+    sort = col1.selectbox("Sort by", list(order_sort_columns), key=f"{key}_sort",
+        format_func=lambda x: x.replace('_', ' ').title())
+    descending = col2.toggle("Descending", key=f"{key}_descending")
+    min_price = col3.number_input("Min price", min_value=0.0, value=None, key=f"{key}_min_price")
+    max_price = col4.number_input("Max price", min_value=0.0, value=None, key=f"{key}_max_price")
+    page_size = col5.selectbox("Rows", [50, 100, 250, 500], index=1, key=f"{key}_page_size")
+
+    total = get_order_summary(is_buy_order, category, item, min_price, max_price)['orders']
+    page_count = max(1, -(-total // page_size))
+    page = st.number_input(f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1, key=f"{key}_page")
+
+    page_df = get_order_page(is_buy_order, category, item, page, page_size, sort, descending, min_price, max_price)
+    st.dataframe(page_df, hide_index=True, column_config=number_config({
+        'order_id': "%d",
+        'type_id': "%d",
+        'volume_remain': COUNT,
+        'price': PRICE,
+    }))
+    first = (page - 1) * page_size
+    st.caption(f"Orders {min(first + 1, total):,}-{min(first + page_size, total):,} of {total:,}")
+
+def create_price_volume_chart(df, log_bins=False):
+    # Bin on the server so the browser gets one point per bin edge rather than every order
+    bins = bin_volume(df['price'], df['volume_remain'], log=log_bins)
+    # drawn as a filled step line over the bin edges, which stays exact on a log axis
+    fig = go.Figure(go.Scatter(
+        x=np.append(bins['left'].to_numpy(), bins['right'].iloc[-1:]),
+        y=np.append(bins['volume'].to_numpy(), bins['volume'].iloc[-1:]),
+        line_shape='hv',
+        fill='tozeroy',
+        customdata=np.append(bins[['left', 'right']].to_numpy(), bins[['left', 'right']].iloc[-1:].to_numpy(), axis=0),
+        hovertemplate="%{customdata[0]:,.2f} - %{customdata[1]:,.2f} ISK<br>Volume: %{y:,.0f}<extra></extra>",
+    ))
     
     # Update layout for better readability
     fig.update_layout(
-        bargap=0.1,  # Add small gaps between bars
+        title='Market Orders Distribution',
         xaxis_title="Price (ISK)",
         yaxis_title="Volume Available",
         showlegend=False
     )
     
     # Format price labels with commas for thousands
-    fig.update_xaxes(tickformat=",")
+    log_axis = log_bins and not bins.empty and bins['left'].iloc[0] > 0
+    fig.update_xaxes(tickformat=",", type="log" if log_axis else "linear")
     
     return fig
 
@@ -237,6 +155,11 @@ def create_history_chart(type_id):
     df = get_market_history(type_id)
     if df.empty:
         return None
+    df = df.assign(date=pd.to_datetime(df['date']))
+    # at most max_points points per trace, whatever the length of the history;
+    # volume is summed into buckets so the bars keep every day's volume
+    price_df = downsample(df, 'date', 'average')
+    volume_df = bucket_sum(df, 'date', 'volume')
     fig = go.Figure()
     # Create subplots: 2 rows, 1 column, shared x-axis
     fig = make_subplots(
@@ -251,8 +174,8 @@ def create_history_chart(type_id):
     # Add price line to the top subplot (row 1)
     fig.add_trace(
         go.Scatter(
-            x=df['date'],
-            y=df['average'],
+            x=price_df['date'],
+            y=price_df['average'],
             name='Average Price',
             line=dict(color='#FF69B4', width=2)  # Hot pink line
         ),
@@ -262,8 +185,8 @@ def create_history_chart(type_id):
     # Add volume bars to the bottom subplot (row 2)
     fig.add_trace(
         go.Bar(
-            x=df['date'],
-            y=df['volume'],
+            x=volume_df['date'],
+            y=volume_df['volume'],
             name='Volume',
             opacity=0.5,            
             marker_color='#00B5F7', 
@@ -342,54 +265,48 @@ def create_history_chart(type_id):
 
 def display_sync_status():
     """Display sync status in the sidebar."""
+    scheduler = get_sync_scheduler()
+    status = scheduler.status()
     st.sidebar.write(f"Last ESI update: {get_update_time()}")
     st.sidebar.markdown("---")
     st.sidebar.subheader("Database Sync Status")
-    status_color = "green" if st.session_state.sync_status == "Success" else "red"
+    status_color = "green" if status.status == "Success" else "red"
     
-    if st.session_state.last_sync:
-        last_sync_time = st.session_state.last_sync.strftime("%Y-%m-%d %H:%M UTC")
+    if status.last_sync:
+        last_sync_time = status.last_sync.strftime("%Y-%m-%d %H:%M UTC")
         st.sidebar.markdown(f"**Last sync:** {last_sync_time}")
-        if st.session_state.next_sync:
-            next_sync_time = st.session_state.next_sync.strftime("%Y-%m-%d %H:%M UTC")
+        if status.next_sync:
+            next_sync_time = status.next_sync.strftime("%Y-%m-%d %H:%M UTC")
             st.sidebar.markdown(f"**Next scheduled sync:** {next_sync_time}")
     else:
         st.sidebar.markdown("**Last sync:** Not yet run")
         
-    st.sidebar.markdown(f"**Status:** <span style='color:{status_color}'>{st.session_state.sync_status}</span>", unsafe_allow_html=True)
+    st.sidebar.markdown(f"**Status:** <span style='color:{status_color}'>{status.status}</span>", unsafe_allow_html=True)
+    if status.retry_at:
+        st.sidebar.markdown(f"**Retrying at:** {status.retry_at.strftime('%Y-%m-%d %H:%M UTC')}")
     
     # Manual sync button
-    if st.sidebar.button("Sync Now"):
-        try:
-            sync_db()
-            st.session_state.sync_status = "Success"
+    if scheduler.follower:
+        st.sidebar.caption("Syncs are run by the syncer process")
+    elif st.sidebar.button("Sync Now", disabled=status.in_progress):
+        synced = scheduler.run_once(force=True)
+        result = scheduler.status().status
+        if synced:
+            st.sidebar.success("Database sync completed successfully!")
             st.rerun()
-        except Exception as e:
-            logger.error(f"st.session_state.sync_status: {st.session_state.sync_status}")
-            st.sidebar.error(f"Sync failed: {str(e)}")
-    
-    if st.session_state.sync_status == "Success":
-        st.sidebar.success("Database sync completed successfully!")
+        elif result.startswith("Failed"):
+            st.sidebar.error(f"Sync {result}")
+        elif result == "Skipped":
+            st.sidebar.info("Skipping sync: This appears to be a local file database that doesn't support sync")
+        else:
+            st.sidebar.info("A sync is already running")
 
 def main():
     logger.info("Starting main function")
 
-    # Initialize all session state variables
-    if not st.session_state.get('sync_status'):
-        initialize_sync_state()
-
-    # Check for sync needs using cached function
-    logger.info("Checking sync status")
-
-    if check_sync_status():
-        logger.info("Sync needed, syncing now")
-        sync_db()
-        st.session_state.sync_status = "Success"
-        st.session_state.update_time = get_update_time()
-        logger.info(f"Sync status updated to: {st.session_state.sync_status}\n, last sync: {st.session_state.last_sync}\n, next sync: {st.session_state.next_sync}\n")
-        st.rerun()
-    else:
-        logger.info(f"No sync needed: last sync: {st.session_state.last_sync}, next sync: {st.session_state.next_sync}\n")
+    # the scheduler syncs in the background; sessions only read its status
+    status = get_sync_scheduler().status()
+    logger.info(f"Sync status: {status.status}, last sync: {status.last_sync}, next sync: {status.next_sync}")
 
     wclogo = "images/wclogo.png"
     st.image(wclogo, width=150)
@@ -444,21 +361,20 @@ def main():
     
     logger.info(f"Selected item: {selected_item}")
     # Main content
-    sell_data, buy_data, stats = get_market_data(show_all, selected_categories, selected_items)
-    
+    # "Show All Data" drops the category filter but keeps a selected item
+    category = selected_category if selected_category and not show_all else None
+    item = selected_item or None
+    sell_summary = get_selection_summary(False, category, item)
+    buy_summary = get_selection_summary(True, category, item)
+    stats = get_stats("SELECT * FROM marketstats")
+
     # Process sell orders
-    sell_order_count = 0
-    sell_total_value = 0
-    if not sell_data.empty:
-        sell_order_count = sell_data['order_id'].nunique()
-        sell_total_value = (sell_data['price'] * sell_data['volume_remain']).sum()
+    sell_order_count = sell_summary['orders']
+    sell_total_value = sell_summary['value']
 
     # Process buy orders
-    buy_order_count = 0
-    buy_total_value = 0
-    if not buy_data.empty:
-        buy_order_count = buy_data['order_id'].nunique()
-        buy_total_value = (buy_data['price'] * buy_data['volume_remain']).sum()
+    buy_order_count = buy_summary['orders']
+    buy_total_value = buy_summary['value']
 
     logger.info(f"sell_order_count: {sell_order_count}")
     logger.info(f"sell_total_value: {sell_total_value}")
@@ -468,13 +384,14 @@ def main():
     fit_df = pd.DataFrame()
     timestamp = None
     
-    if not sell_data.empty:
+    # the first sell order by type_id, as before paging; the page can be empty even
+    # when the summary counts orders, if the rollup lags the replica after a sync
+    first_page = get_order_page(False, category, item, page_size=1) if sell_order_count > 0 else pd.DataFrame()
+    if not first_page.empty:
+        first_order = first_page.iloc[0]
+        type_id = first_order['type_id']
         if len(selected_items) == 1:
-            sell_data = sell_data[sell_data['type_name'] == selected_items[0]]
-            if not buy_data.empty:
-                buy_data = buy_data[buy_data['type_name'] == selected_items[0]]
             stats = stats[stats['type_name'] == selected_items[0]]
-            type_id = sell_data['type_id'].iloc[0]
             if type_id: 
                 fit_df, timestamp = get_fitting_data(type_id)
             else:
@@ -487,7 +404,7 @@ def main():
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            if not sell_data.empty:
+            if sell_order_count > 0:
                 min_price = stats['min_price'].min()
                 if pd.notna(min_price) and selected_items:
                     display_min_price = millify.millify(min_price, precision=2)
@@ -502,8 +419,8 @@ def main():
                 st.metric("Market Value (sell orders)", "0 ISK")
 
         with col2:
-            if not sell_data.empty:
-                volume = sell_data['volume_remain'].sum()
+            if sell_order_count > 0:
+                volume = sell_summary['volume']
                 if pd.notna(volume):
                     display_volume = millify.millify(volume, precision=2)
                     st.metric("Market Stock (sell orders)", f"{display_volume}")
@@ -535,24 +452,22 @@ def main():
             except:
                 pass
         
+        display_order_depth(category, item)
         
         st.divider()
         # Display detailed data
 
-        # Format the DataFrame for display with null handling
-        display_df = sell_data.copy()
-
         #create a header for the item
         if len(selected_items) == 1:
-            image_id = display_df.iloc[0]['type_id']
-            type_name = display_df.iloc[0]['type_name']
+            image_id = type_id
+            type_name = selected_items[0]
             st.subheader(f"{type_name}", divider="blue")
             col1, col2 = st.columns(2)
             with col1:
                 if isship:
-                    st.image(f'https://images.evetech.net/types/{image_id}/render?size=64')
+                    st.image(type_image(image_id, "render", 64))
                 else:
-                    st.image(f'https://images.evetech.net/types/{image_id}/icon')
+                    st.image(type_image(image_id, "icon", 64))
             with col2:
                 try:
                     if fits_on_mkt:
@@ -573,25 +488,10 @@ def main():
         else:
             st.subheader("All Sell Orders", divider="green")
 
-        display_df.type_id = display_df.type_id.astype(str)
-        display_df.order_id = display_df.order_id.astype(str)
-        display_df.drop(columns='is_buy_order', inplace=True)
-        # Format numeric columns safely
-        numeric_formats = {
-            'volume_remain': '{:,.0f}',
-            'price': '{:,.2f}',
-            'min_price': '{:,.2f}',
-            'avg_of_avg_price': '{:,.2f}',
-        }
-
-        for col, format_str in numeric_formats.items():
-            if col in display_df.columns:  # Only format if column exists
-                display_df[col] = display_df[col].apply(lambda x: safe_format(x, format_str))
-
-        st.dataframe(display_df, hide_index=True)
+        display_order_table("sell", False, category, item)
         
         # Display buy orders if they exist
-        if not buy_data.empty:
+        if buy_order_count > 0:
             # Display buy orders header
             if len(selected_items) == 1:
                 st.subheader(f"Buy Orders for {type_name}", divider="orange")
@@ -619,28 +519,20 @@ def main():
                 else:
                     st.metric("Total Buy Orders", "0")
             
-            # Format buy orders for display
-            buy_display_df = buy_data.copy()
-            buy_display_df.type_id = buy_display_df.type_id.astype(str)
-            buy_display_df.order_id = buy_display_df.order_id.astype(str)
-            buy_display_df.drop(columns='is_buy_order', inplace=True)
-            
-            # Format numeric columns safely
-            for col, format_str in numeric_formats.items():
-                if col in buy_display_df.columns:  # Only format if column exists
-                    buy_display_df[col] = buy_display_df[col].apply(lambda x: safe_format(x, format_str))
-            
-            st.dataframe(buy_display_df, hide_index=True)
+            display_order_table("buy", True, category, item)
 
         # Display charts
         st.subheader("Market Order Distribution")
-        price_vol_chart = create_price_volume_chart(sell_data)
+        log_bins = st.checkbox("Log price bins", value=show_all, help="Log-spaced price bins suit wide price ranges")
+        # figures are shared across sessions until the next sync
+        price_vol_chart = figures.get_or_build("price_volume", (category, item, log_bins), status.generation,
+            lambda: create_price_volume_chart(get_order_prices(False, category, item), log_bins))
         st.plotly_chart(price_vol_chart, use_container_width=True)
         
         st.divider()
 
         st.subheader("Price History")
-        history_chart = create_history_chart(sell_data['type_id'].iloc[0])
+        history_chart = figures.get_or_build("history", type_id, status.generation, lambda: create_history_chart(type_id))
         if history_chart:
             st.plotly_chart(history_chart, use_container_width=False)
         
@@ -648,7 +540,7 @@ def main():
             with colh1:
                 # Display history data
                 st.subheader("History Data")
-                history_df = get_market_history(sell_data['type_id'].iloc[0])
+                history_df = get_market_history(type_id)
                 history_df.date = pd.to_datetime(history_df.date).dt.strftime("%Y-%m-%d")
                 history_df.average = round(history_df.average.astype(float), 2)
                 history_df = history_df.sort_values(by='date', ascending=False)
@@ -658,7 +550,7 @@ def main():
             with colh2:
                 avgpr30 = history_df[:30].average.mean()
                 avgvol30 = history_df[:30].volume.mean()
-                st.subheader(f"{sell_data['type_name'].iloc[0]}",divider=True)
+                st.subheader(f"{first_order['type_name']}",divider=True)
                 st.metric("Average Price (30 days)", f"{avgpr30:,.2f} ISK")
                 st.metric("Average Volume (30 days)", f"{avgvol30:,.0f}")
         else:
@@ -669,7 +561,12 @@ def main():
         st.subheader("Fitting Data")
         if len(selected_items) == 1:
             if isship:
-                st.dataframe(fit_df, hide_index=True)
+                st.dataframe(fit_df, hide_index=True, column_config=number_config({
+                    'total_stock': COUNT,
+                    '4H_price': PRICE,
+                    'avg_vol': COUNT,
+                    'days': COUNT,
+                }))
             else:
                 st.write("Fitting data only available for ships")
         else:
@@ -0,0 +1,153 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from millify import millify
+
+from logging_config import setup_logging
+from db_utils import get_sync_scheduler
+from sync_state import sync_state
+from sync_pipeline import load_stage_runs
+from presentation import number_config, highlight, COUNT, DECIMAL
+
+logger = setup_logging(__name__)
+
+
+def get_ledger(limit: int) -> pd.DataFrame:
+    df = pd.DataFrame(sync_state.load_ledger(limit))
+    if df.empty:
+        return df
+    df = df.sort_values("started_at")
+    df["size_delta_kb"] = df["size_delta"] / 1024
+    df["net_row_change"] = df["row_deltas"].map(lambda deltas: sum(abs(v) for v in deltas.values()))
+    return df
+
+
+def create_duration_chart(df: pd.DataFrame):
+    data = df.melt(id_vars=["started_at", "status"], value_vars=["duration", "warmup_duration"], var_name="phase", value_name="seconds")
+    data["phase"] = data["phase"].map({"duration": "sync", "warmup_duration": "warm-up"})
+    fig = px.line(
+        data,
+        x="started_at",
+        y="seconds",
+        color="phase",
+        markers=True,
+        title="Sync and warm-up time",
+        labels={"started_at": "Started", "seconds": "Seconds", "phase": "Phase"},
+    )
+    return fig
+
+
+def create_size_chart(df: pd.DataFrame):
+    fig = px.bar(
+        df,
+        x="started_at",
+        y="size_delta_kb",
+        color="status",
+        title="Replica size change per sync",
+        labels={"started_at": "Started", "size_delta_kb": "Size change (KB)", "status": "Status"},
+    )
+    return fig
+
+
+def create_row_delta_chart(df: pd.DataFrame):
+    rows = [
+        {"started_at": started_at, "table": table, "row_delta": delta}
+        for started_at, deltas in zip(df["started_at"], df["row_deltas"])
+        for table, delta in deltas.items()
+        if delta
+    ]
+    if not rows:
+        return None
+    fig = px.bar(
+        pd.DataFrame(rows),
+        x="started_at",
+        y="row_delta",
+        color="table",
+        title="Net row change per table",
+        labels={"started_at": "Started", "row_delta": "Rows", "table": "Table"},
+    )
+    return fig
+
+
+def create_stage_chart(stages: pd.DataFrame):
+    fig = px.box(
+        stages[stages["status"] == "ran"],
+        x="stage",
+        y="duration",
+        points="all",
+        title="Post-sync stage time",
+        labels={"stage": "Stage", "duration": "Seconds"},
+    )
+    return fig
+
+
+def main():
+    st.title("Database Sync History")
+    st.markdown("""
+    Every database sync is recorded with its duration, the change in replica size, the net row change per table and the time
+    spent on post-sync warm-up. Use it to spot slow or failing syncs and to size the sync schedule.
+    """)
+
+    status = get_sync_scheduler().status()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Status", status.status)
+    col2.metric("Last sync", status.last_sync.strftime("%Y-%m-%d %H:%M UTC") if status.last_sync else "Not yet run")
+    col3.metric("Next sync", status.next_sync.strftime("%Y-%m-%d %H:%M UTC") if status.next_sync else "-")
+    col4.metric("Last duration", f"{status.duration:.1f} s" if status.duration is not None else "-")
+
+    limit = st.sidebar.number_input("Syncs to show", min_value=10, max_value=5000, value=200, step=50)
+    df = get_ledger(limit)
+    if df.empty:
+        st.info("No syncs recorded yet")
+        return
+
+    successful = df[df["status"] == "success"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Syncs", len(df))
+    col2.metric("Failures", int((df["status"] == "failed").sum()))
+    col3.metric("Median sync time", f"{successful['duration'].median():.1f} s" if not successful.empty else "-")
+    col4.metric("Replica growth", f"{millify(df['size_delta'].fillna(0).sum(), precision=1)}B")
+
+    st.plotly_chart(create_duration_chart(df), use_container_width=True)
+    st.plotly_chart(create_size_chart(df), use_container_width=True)
+    row_chart = create_row_delta_chart(df)
+    if row_chart:
+        st.plotly_chart(row_chart, use_container_width=True)
+
+    stages = pd.DataFrame(load_stage_runs(limit=limit * 10))
+    if not stages.empty:
+        st.subheader("Post-sync pipeline")
+        latest = stages[stages["run_started_at"] == stages["run_started_at"].iloc[0]]
+        st.dataframe(latest[["stage", "status", "duration", "error"]], hide_index=True, column_config={
+            "stage": st.column_config.Column("Stage"),
+            "status": st.column_config.Column("Status"),
+            "error": st.column_config.Column("Error"),
+            **number_config({"duration": "%.2f"}, {"duration": "Seconds"}),
+        })
+        if (stages["status"] == "ran").any():
+            st.plotly_chart(create_stage_chart(stages), use_container_width=True)
+
+    st.subheader("Sync runs")
+    st.caption("Net row change sums each table's change in row count, so rows replaced in place or deleted and re-inserted don't show up.")
+    display_df = df[["started_at", "status", "duration", "warmup_duration", "size_delta_kb", "net_row_change", "error"]].iloc[::-1]
+    display_df = highlight(display_df, [("status", display_df["status"].to_numpy() == "failed", "background-color: #fc4103")])
+    st.dataframe(display_df, hide_index=True, column_config={
+        "started_at": st.column_config.DatetimeColumn("Started", format="YYYY-MM-DD HH:mm:ss"),
+        "status": st.column_config.Column("Status"),
+        "error": st.column_config.Column("Error"),
+        **number_config({
+            "duration": DECIMAL,
+            "warmup_duration": DECIMAL,
+            "size_delta_kb": COUNT,
+            "net_row_change": COUNT,
+        }, {
+            "duration": "Sync (s)",
+            "warmup_duration": "Warm-up (s)",
+            "size_delta_kb": "Size change (KB)",
+            "net_row_change": "Net row change",
+        }),
+    })
+
+
+if __name__ == "__main__":
+    main()
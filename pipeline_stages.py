@@ -0,0 +1,47 @@
+import pandas as pd
+import sqlalchemy as sa
+
+from image_cache import prefetch_doctrine_images
+from market_rollup import orders_query as rollup_orders_query, rollup, sde_url, types_query
+from order_depth import depth_metrics, orders_query as depth_orders_query
+from stock_alerts import emit, evaluate
+from stock_forecast import forecast, history_query, stock_query
+from sync_pipeline import pipeline, replace_table
+
+
+@pipeline.stage("doctrine_images", inputs=("doctrines", "lead_ships"), outputs=("image_cache",))
+def doctrine_images(context):
+    prefetch_doctrine_images(context.source_engine)
+
+
+@pipeline.stage("stock_forecast", inputs=("market_history", "marketstats"), outputs=("stock_forecast",))
+def stock_forecast(context):
+    with context.source_engine.connect() as conn:
+        history = pd.read_sql_query(history_query, conn)
+        stock = pd.read_sql_query(stock_query, conn)
+    replace_table(context.derived_engine, "stock_forecast", forecast(history, stock, context.run_started_at), indexes=("type_id",))
+
+
+@pipeline.stage("stock_alerts", inputs=("marketstats", "doctrines", "ship_targets"), outputs=("stock_alert_state",))
+def stock_alerts(context):
+    emit(evaluate(context.source_engine, context.derived_engine, context.run_started_at))
+
+
+@pipeline.stage("order_depth", inputs=("marketorders",), outputs=("order_depth",))
+def order_depth(context):
+    with context.source_engine.connect() as conn:
+        orders = pd.read_sql_query(depth_orders_query, conn)
+    replace_table(context.derived_engine, "order_depth", depth_metrics(orders), indexes=("type_id",))
+
+
+@pipeline.stage("market_rollup", inputs=("marketorders",), outputs=("market_rollup",))
+def market_rollup(context):
+    with context.source_engine.connect() as conn:
+        orders = pd.read_sql_query(rollup_orders_query, conn)
+    sde_engine = sa.create_engine(sde_url)
+    try:
+        with sde_engine.connect() as conn:
+            types = pd.read_sql_query(types_query, conn)
+    finally:
+        sde_engine.dispose()
+    replace_table(context.derived_engine, "market_rollup", rollup(orders, types), indexes=("key", "name"))
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# st.column_config number formats; numeric columns are left numeric and
+# formatted by the frontend instead of being converted to strings
+COUNT = "localized"
+PRICE = "accounting"
+COMPACT = "compact"
+DECIMAL = "%.1f"
+
+
+def to_numeric(df: pd.DataFrame, decimals: dict[str, int]) -> pd.DataFrame:
+    """Coerce columns to numbers (invalid values become NaN) and round them for display."""
+    df = df.copy()
+    for col, places in decimals.items():
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").round(places)
+    return df
+
+
+def number_config(formats: dict[str, str], labels: dict[str, str] | None = None) -> dict:
+    """column_config entries for numeric columns, e.g. {"price": PRICE}."""
+    labels = labels or {}
+    return {col: st.column_config.NumberColumn(labels.get(col, col), format=fmt) for col, fmt in formats.items()}
+
+
+def highlight_styles(df: pd.DataFrame, rules: list[tuple[str | None, np.ndarray, str]]) -> pd.DataFrame:
+    """CSS for every cell from (column, row mask, css) rules; column None styles the whole row.
+
+    Later rules take precedence over earlier ones.
+    """
+    styles = np.full(df.shape, "", dtype=object)
+    for col, mask, css in rules:
+        mask = np.asarray(mask, dtype=bool)
+        if col is None:
+            styles[mask, :] = css
+        else:
+            styles[mask, df.columns.get_loc(col)] = css
+    return pd.DataFrame(styles, index=df.index, columns=df.columns)
+
+
+def highlight(df: pd.DataFrame, rules: list[tuple[str | None, np.ndarray, str]]):
+    """Apply highlight rules with a single Styler call; returns df unchanged if nothing matches."""
+    styles = highlight_styles(df, rules)
+    if not (styles.to_numpy() != "").any():
+        return df
+    return df.style.apply(lambda _: styles, axis=None)
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import requests
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+fuzzwork_aggregates_url = "https://market.fuzzwork.co.uk/aggregates/"
+jita_region_id = 10000002
+
+
+class PriceFeed:
+    """Process-wide cache of fuzzwork market aggregates for one region.
+
+    Prices are requested in comma-separated batches. Fresh entries are served
+    from memory; stale entries are served immediately while a background
+    thread refreshes them, and only unknown types block on a request.
+    """
+
+    def __init__(self, url: str = fuzzwork_aggregates_url, region_id: int = jita_region_id, ttl: float = 900, chunk_size: int = 200, timeout: float = 10):
+        self.url = url
+        self.region_id = region_id
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._aggregates = {}  # type_id -> (fetched_at, aggregate)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def fetch(self, type_ids: list[int]) -> dict[int, dict]:
+        """Request aggregates for type_ids and store them; returns what was fetched."""
+        fetched = {}
+        for i in range(0, len(type_ids), self.chunk_size):
+            chunk = type_ids[i:i + self.chunk_size]
+            types = ",".join(str(int(type_id)) for type_id in chunk)
+            try:
+                response = requests.get(self.url, params={"region": self.region_id, "types": types}, timeout=self.timeout)
+            except requests.RequestException as e:
+                logger.error(f"Error fetching prices for {len(chunk)} types: {e}")
+                continue
+            if response.status_code != 200:
+                logger.error(f"Error fetching prices for {len(chunk)} types: {response.status_code}")
+                continue
+            now = time.monotonic()
+            data = response.json()
+            with self._lock:
+                for type_id, aggregate in data.items():
+                    self._aggregates[int(type_id)] = (now, aggregate)
+                    fetched[int(type_id)] = aggregate
+        return fetched
+
+    def _refresh(self, type_ids: list[int]):
+        try:
+            self.fetch(type_ids)
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(type_ids)
+
+    def get_aggregates(self, type_ids: list[int]) -> dict[int, dict]:
+        """Aggregates for type_ids, serving stale values while they refresh in the background."""
+        type_ids = list(dict.fromkeys(int(type_id) for type_id in type_ids))
+        now = time.monotonic()
+        results = {}
+        missing = []
+        stale = []
+        with self._lock:
+            for type_id in type_ids:
+                entry = self._aggregates.get(type_id)
+                if entry is None:
+                    missing.append(type_id)
+                    continue
+                fetched_at, aggregate = entry
+                results[type_id] = aggregate
+                if now - fetched_at > self.ttl and type_id not in self._refreshing:
+                    stale.append(type_id)
+            self._refreshing.update(stale)
+
+        if stale:
+            threading.Thread(target=self._refresh, args=(stale,), daemon=True).start()
+        if missing:
+            results.update(self.fetch(missing))
+        return results
+
+    def get_prices(self, type_ids: list[int], side: str = "sell", stat: str = "percentile") -> dict[int, float]:
+        """Price per type_id for one side/statistic; types without a positive price are omitted."""
+        prices = {}
+        for type_id, aggregate in self.get_aggregates(type_ids).items():
+            try:
+                price = float(aggregate[side][stat])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if price > 0:
+                prices[type_id] = price
+        return prices
+
+    def get_price(self, type_id: int, side: str = "sell", stat: str = "percentile") -> float | None:
+        return self.get_prices([type_id], side, stat).get(int(type_id))
+
+    def clear(self):
+        with self._lock:
+            self._aggregates.clear()
+
+
+jita_prices = PriceFeed()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,185 @@
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from dataclasses import dataclass
+
+import sqlalchemy as sa
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+# "single": every process syncs its own replica (default)
+# "syncer": sync the replica and publish snapshots for workers
+# "worker": never sync; read the latest published snapshot
+deploy_mode = os.environ.get("WCMKT_DEPLOY_MODE", "single")
+snapshot_dir = os.environ.get("WCMKT_SNAPSHOT_DIR", "snapshots")
+pointer_file = "CURRENT"
+keep_snapshots = 3
+mmap_size = 256 * 1024 * 1024
+
+market_db = "wcmkt.db"
+derived_db = "derived.db"
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    market_db: str
+    derived_db: str | None
+    published_at: str
+
+
+def _copy_database(source: str, target: str):
+    """Consistent copy of a live database into a standalone file that needs no WAL."""
+    tmp = f"{target}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with closing(sqlite3.connect(f"file:{source}?mode=ro", uri=True)) as src, closing(sqlite3.connect(tmp)) as dst:
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode=DELETE")
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, target)
+
+
+class SnapshotStore:
+    """Immutable, versioned copies of the market replica shared between processes.
+
+    The syncer copies the replica (and derived.db) into a new versioned file
+    after every sync, then swaps the CURRENT pointer atomically. Workers open
+    the file the pointer names read only (immutable, memory mapped), so they
+    share the page cache and never see a half-synced database. Old versions
+    are kept for a while, because workers switch over on their next cache
+    clear rather than mid-query.
+    """
+
+    def __init__(self, directory: str = snapshot_dir, keep: int = keep_snapshots):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._current = None
+        self._pointer_mtime = None
+
+    @property
+    def pointer_path(self) -> str:
+        return os.path.join(self.directory, pointer_file)
+
+    def current(self) -> Snapshot | None:
+        """The published snapshot, re-read only when the pointer file changes."""
+        try:
+            mtime = os.stat(self.pointer_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if mtime != self._pointer_mtime:
+                with open(self.pointer_path, "r") as f:
+                    pointer = json.load(f)
+                self._current = Snapshot(
+                    version=pointer["version"],
+                    market_db=os.path.join(self.directory, pointer["market_db"]),
+                    derived_db=os.path.join(self.directory, pointer["derived_db"]) if pointer.get("derived_db") else None,
+                    published_at=pointer["published_at"],
+                )
+                self._pointer_mtime = mtime
+            return self._current
+
+    def publish(self, market_path: str = market_db, derived_path: str = derived_db) -> Snapshot:
+        """Copy the replica (and derived data, if any) into a new version and point CURRENT at it."""
+        os.makedirs(self.directory, exist_ok=True)
+        current = self.current()
+        version = current.version + 1 if current else 1
+
+        market_name = f"wcmkt-{version}.db"
+        _copy_database(market_path, os.path.join(self.directory, market_name))
+        derived_name = None
+        if os.path.exists(derived_path):
+            derived_name = f"derived-{version}.db"
+            _copy_database(derived_path, os.path.join(self.directory, derived_name))
+
+        pointer = {
+            "version": version,
+            "market_db": market_name,
+            "derived_db": derived_name,
+            "published_at": dt.datetime.now(dt.UTC).isoformat(),
+        }
+        tmp = f"{self.pointer_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(pointer, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.pointer_path)
+        logger.info(f"Published snapshot {version}")
+        self._prune(version)
+        return self.current()
+
+    def _prune(self, version: int):
+        for name in os.listdir(self.directory):
+            prefix, _, rest = name.partition("-")
+            if prefix not in ("wcmkt", "derived") or not rest.endswith(".db"):
+                continue
+            try:
+                old = int(rest[:-3])
+            except ValueError:
+                continue
+            if old <= version - self.keep:
+                os.remove(os.path.join(self.directory, name))
+
+
+snapshots = SnapshotStore()
+
+
+def market_db_path() -> str:
+    """The market database this process reads: the current snapshot in worker mode, else the replica."""
+    if deploy_mode == "worker":
+        snapshot = snapshots.current()
+        if snapshot is None:
+            raise RuntimeError(f"No snapshot published in {snapshot_dir}; start the syncer first")
+        return snapshot.market_db
+    return market_db
+
+
+def derived_db_path() -> str:
+    """The derived database this process reads, following the snapshot in worker mode."""
+    if deploy_mode == "worker":
+        snapshot = snapshots.current()
+        if snapshot is None or snapshot.derived_db is None:
+            raise RuntimeError(f"No derived snapshot published in {snapshot_dir}; start the syncer first")
+        return snapshot.derived_db
+    return derived_db
+
+
+def connect(path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """sqlite3 connection; snapshots are opened read only, immutable and memory mapped."""
+    if deploy_mode != "worker":
+        return sqlite3.connect(path, check_same_thread=check_same_thread)
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=check_same_thread)
+    conn.execute(f"PRAGMA mmap_size={mmap_size}")
+    return conn
+
+
+def create_engine(path: str, attach: dict[str, str] | None = None, **kwargs) -> sa.Engine:
+    """SQLAlchemy engine for a market or derived database (see connect).
+
+    attach maps schema names to databases that every connection attaches read
+    only, so queries can join across them (e.g. {"sde": "sde.db"}).
+    """
+    if deploy_mode != "worker":
+        engine = sa.create_engine(f"sqlite:///file:{path}?uri=true", **kwargs)
+    else:
+        engine = sa.create_engine(f"sqlite:///file:{path}?mode=ro&immutable=1&uri=true", **kwargs)
+
+    @sa.event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if deploy_mode == "worker":
+            dbapi_connection.execute(f"PRAGMA mmap_size={mmap_size}")
+        for schema, attached_path in (attach or {}).items():
+            dbapi_connection.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{attached_path}?mode=ro",))
+
+    return engine
+
+if __name__ == "__main__":
+    print(snapshots.current())
@@ -0,0 +1,155 @@
+import datetime as dt
+import os
+
+import numpy as np
+import pandas as pd
+import requests
+import sqlalchemy as sa
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+alert_log = "stock_alerts.log"
+_alert_logger = None
+
+alert_csv = os.environ.get("WCMKT_ALERT_CSV", "stock_alerts.csv")
+alert_webhook = os.environ.get("WCMKT_ALERT_WEBHOOK")
+default_target = 20
+
+# (upper bound, level), checked in order; above the last bound is "ok"
+item_levels = [(3, "critical"), (7, "low")]
+fit_levels = [(40, "critical"), (90, "needs attention")]
+
+item_query = """
+    SELECT type_id as key, type_name as name, days_remaining as value
+    FROM marketstats
+"""
+
+fit_query = """
+    SELECT d.fit_id as key, MIN(d.ship_name) as name, MIN(d.fits_on_mkt) as fits, t.ship_target as target
+    FROM doctrines d
+    LEFT JOIN ship_targets t ON d.fit_id = t.fit_id
+    GROUP BY d.fit_id
+"""
+
+metadata = sa.MetaData()
+
+alert_state_table = sa.Table(
+    "stock_alert_state",
+    metadata,
+    sa.Column("kind", sa.String, primary_key=True),
+    sa.Column("key", sa.Integer, primary_key=True),
+    sa.Column("name", sa.String),
+    sa.Column("value", sa.Float),
+    sa.Column("level", sa.String, nullable=False),
+    sa.Column("updated_at", sa.String, nullable=False),
+)
+
+def get_alert_logger():
+    """Logger writing to stock_alerts.log, created on first use so importing this module creates no file."""
+    global _alert_logger
+    if _alert_logger is None:
+        _alert_logger = setup_logging("stock_alerts", log_file=alert_log)
+    return _alert_logger
+
+
+event_columns = ["detected_at", "kind", "key", "name", "transition", "old_level", "new_level", "old_value", "new_value"]
+
+
+def classify(values: np.ndarray, levels: list[tuple[float, str]]) -> np.ndarray:
+    """Level per value; missing values count as "ok"."""
+    conditions = [values <= bound for bound, _ in levels]
+    return np.select(conditions, [level for _, level in levels], default="ok")
+
+
+def current_levels(conn) -> pd.DataFrame:
+    """Current value and level of every item (days remaining) and doctrine fit (% of target)."""
+    items = pd.read_sql_query(item_query, conn)
+    items["kind"] = "item"
+    items["level"] = classify(items["value"].to_numpy(dtype=float), item_levels)
+
+    fits = pd.read_sql_query(fit_query, conn)
+    target = fits["target"].fillna(default_target).to_numpy(dtype=float)
+    percentage = np.where(target > 0, np.minimum(100, fits["fits"].to_numpy(dtype=float) / np.where(target > 0, target, 1) * 100), 0)
+    fits = fits.assign(kind="fit", value=np.floor(percentage))
+    fits["level"] = classify(fits["value"].to_numpy(), fit_levels)
+
+    columns = ["kind", "key", "name", "value", "level"]
+    return pd.concat([items[columns], fits[columns]], ignore_index=True).drop_duplicates(subset=["kind", "key"])
+
+
+def diff(previous: pd.DataFrame, current: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Rows whose value or level changed, rows that disappeared, and the level transitions among the changes."""
+    merged = current.merge(previous, on=["kind", "key"], how="outer", suffixes=("", "_old"), indicator=True)
+    present = merged["_merge"] != "right_only"
+    same_value = (merged["value"] == merged["value_old"]) | (merged["value"].isna() & merged["value_old"].isna())
+    changed = merged[present & ~(same_value & (merged["level"] == merged["level_old"]))]
+    removed = merged[~present][["kind", "key"]]
+
+    moved = changed[(changed["_merge"] == "both") & (changed["level"] != changed["level_old"])]
+    transitions = moved.rename(columns={"level_old": "old_level", "level": "new_level", "value_old": "old_value", "value": "new_value"})
+    transitions = transitions.assign(transition=np.select(
+        [transitions["new_level"] == "critical", transitions["new_level"] == "ok"],
+        ["critical", "recovered"],
+        default=np.where(transitions["old_level"] == "critical", "improved", "worsened"),
+    ))
+    return changed[["kind", "key", "name", "value", "level"]], removed, transitions
+
+
+def evaluate(source_engine: sa.Engine, derived_engine: sa.Engine, now: dt.datetime | None = None) -> pd.DataFrame:
+    """Compare the replica with the last evaluation and store the changes; returns the level transitions.
+
+    The first evaluation only records a baseline.
+    """
+    now = now or dt.datetime.now(dt.UTC)
+    metadata.create_all(derived_engine)
+    with source_engine.connect() as conn:
+        current = current_levels(conn)
+    with derived_engine.connect() as conn:
+        previous = pd.read_sql_query(sa.select(alert_state_table.c.kind, alert_state_table.c.key, alert_state_table.c.value, alert_state_table.c.level), conn)
+    changed, removed, transitions = diff(previous, current)
+
+    updated_at = now.isoformat()
+    rows = [
+        {**row, "value": None if pd.isna(row["value"]) else row["value"], "updated_at": updated_at}
+        for row in changed.to_dict("records")
+    ]
+    with derived_engine.begin() as conn:
+        if rows:
+            conn.execute(sa.insert(alert_state_table).prefix_with("OR REPLACE"), rows)
+        for kind, keys in removed.groupby("kind")["key"]:
+            conn.execute(sa.delete(alert_state_table).where(alert_state_table.c.kind == kind, alert_state_table.c.key.in_(keys.tolist())))
+    logger.info(f"Stock alerts: {len(changed)} changed, {len(removed)} removed, {len(transitions)} transitions")
+
+    if previous.empty:
+        logger.info("Stock alert baseline recorded")
+        return pd.DataFrame(columns=event_columns)
+    return transitions.assign(detected_at=updated_at)[event_columns].reset_index(drop=True)
+
+
+def emit(events: pd.DataFrame, csv_path: str | None = alert_csv, webhook: str | None = alert_webhook):
+    """Send transitions to the alert log, append them to the CSV drop and post them to the webhook."""
+    if events.empty:
+        return
+    alert_logger = get_alert_logger()
+    for event in events.itertuples(index=False):
+        message = f"{event.kind} {event.name} ({event.key}) {event.transition}: {event.old_level} -> {event.new_level} ({event.old_value} -> {event.new_value})"
+        if event.transition == "critical":
+            alert_logger.warning(message)
+        else:
+            alert_logger.info(message)
+
+    if csv_path:
+        events.to_csv(csv_path, mode="a", header=not os.path.exists(csv_path), index=False)
+
+    if webhook:
+        try:
+            payload = {"events": events.astype(object).where(events.notna(), None).to_dict("records")}
+            requests.post(webhook, json=payload, timeout=10).raise_for_status()
+        except requests.RequestException as e:
+            logger.error(f"Error posting stock alerts to webhook: {e}")
+
+
+if __name__ == "__main__":
+    engine = sa.create_engine("sqlite:///wcmkt.db")
+    emit(evaluate(engine, sa.create_engine("sqlite:///derived.db")))
@@ -0,0 +1,143 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+window_days = 90
+halflife_days = 7
+z_score = 1.645  # 90% band
+urgency_levels = [(3, "critical"), (7, "low"), (14, "watch")]
+
+forecast_columns = [
+    "type_id",
+    "stock",
+    "demand_rate",
+    "demand_std",
+    "trend",
+    "days_remaining",
+    "days_early",
+    "days_late",
+    "stockout_date",
+    "stockout_early",
+    "stockout_late",
+    "urgency",
+    "history_days",
+    "forecast_at",
+]
+
+history_query = f"""
+    SELECT type_id, date, volume
+    FROM market_history
+    WHERE date >= date((SELECT MAX(date) FROM market_history), '-{window_days - 1} day')
+"""
+
+stock_query = """
+    SELECT type_id, total_volume_remain as stock
+    FROM marketstats
+"""
+
+
+def volume_matrix(history: pd.DataFrame, window: int = window_days) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Daily volume as a (types x days) array, oldest day first, with zeros for days without trades.
+
+    Also returns the type_ids for the rows and, per type, how many days back its history goes.
+    """
+    type_ids, rows = np.unique(history["type_id"].to_numpy(), return_inverse=True)
+    days = pd.to_datetime(history["date"]).dt.normalize()
+    age = (days.max() - days).dt.days.to_numpy()
+    inside = age < window
+    volumes = np.zeros((len(type_ids), window))
+    np.add.at(volumes, (rows[inside], window - 1 - age[inside]), history["volume"].to_numpy(dtype=float)[inside])
+    first_day = np.zeros(len(type_ids), dtype=int)
+    np.maximum.at(first_day, rows[inside], age[inside] + 1)
+    return type_ids, volumes, first_day
+
+
+def demand(volumes: np.ndarray, halflife: float = halflife_days) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Exponentially weighted daily demand and its standard deviation, plus the 7 day / 30 day trend."""
+    window = volumes.shape[1]
+    weights = 0.5 ** (np.arange(window)[::-1] / halflife)
+    weights /= weights.sum()
+    rate = volumes @ weights
+    std = np.sqrt(np.maximum((volumes - rate[:, None]) ** 2 @ weights, 0))
+    totals = np.cumsum(volumes[:, ::-1], axis=1)
+    recent = totals[:, min(7, window) - 1] / min(7, window)
+    month = totals[:, min(30, window) - 1] / min(30, window)
+    trend = np.divide(recent, month, out=np.ones_like(recent), where=month > 0)
+    return rate, std, trend
+
+
+def stockout_days(stock: np.ndarray, rate: np.ndarray, std: np.ndarray, z: float = z_score) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Expected days until stock runs out, with an early/late band.
+
+    Demand over d days is taken as rate*d with standard deviation std*sqrt(d);
+    the band is where stock = rate*d +/- z*std*sqrt(d), solved for d.
+    """
+    stock = np.maximum(stock, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = np.where(rate > 0, stock / rate, np.inf)
+        spread = z * std
+        root = np.sqrt(spread ** 2 + 4 * rate * stock)
+        early = np.where(rate > 0, ((root - spread) / (2 * rate)) ** 2, np.where(spread > 0, (stock / spread) ** 2, np.inf))
+        late = np.where(rate > 0, ((root + spread) / (2 * rate)) ** 2, np.inf)
+    # already sold out
+    out = stock == 0
+    return np.where(out, 0, expected), np.where(out, 0, early), np.where(out, 0, late)
+
+
+def forecast(history: pd.DataFrame, stock: pd.DataFrame, now: dt.datetime | None = None) -> pd.DataFrame:
+    """Stock-out forecast for every type in stock (type_id, stock), from market_history volumes."""
+    now = now or dt.datetime.now(dt.UTC)
+    stock = stock.dropna(subset=["type_id"]).drop_duplicates(subset=["type_id"])
+    type_ids = stock["type_id"].to_numpy(dtype=np.int64)
+    on_hand = stock["stock"].fillna(0).to_numpy(dtype=float)
+
+    rate = np.zeros(len(type_ids))
+    std = np.zeros(len(type_ids))
+    trend = np.ones(len(type_ids))
+    history_days = np.zeros(len(type_ids), dtype=int)
+    if not history.empty:
+        history_types, volumes, first_day = volume_matrix(history)
+        type_rate, type_std, type_trend = demand(volumes)
+        rows = np.searchsorted(history_types, type_ids)
+        found = (rows < len(history_types)) & (history_types[np.minimum(rows, len(history_types) - 1)] == type_ids)
+        rate[found] = type_rate[rows[found]]
+        std[found] = type_std[rows[found]]
+        trend[found] = type_trend[rows[found]]
+        history_days[found] = first_day[rows[found]]
+
+    expected, early, late = stockout_days(on_hand, rate, std)
+    conditions = [early <= days for days, _ in urgency_levels]
+    urgency = np.select(conditions, [level for _, level in urgency_levels], default="ok")
+
+    def to_date(days):
+        finite = np.isfinite(days) & (days < 3650)
+        dates = pd.Series(pd.NaT, index=range(len(days)), dtype="datetime64[ns, UTC]")
+        dates[finite] = (pd.Timestamp(now) + pd.to_timedelta(days[finite], unit="D")).floor("min")
+        return dates
+
+    df = pd.DataFrame({
+        "type_id": type_ids,
+        "stock": on_hand,
+        "demand_rate": rate,
+        "demand_std": std,
+        "trend": trend,
+        "days_remaining": np.where(np.isfinite(expected), expected, np.nan),
+        "days_early": np.where(np.isfinite(early), early, np.nan),
+        "days_late": np.where(np.isfinite(late), late, np.nan),
+        "stockout_date": to_date(expected),
+        "stockout_early": to_date(early),
+        "stockout_late": to_date(late),
+        "urgency": urgency,
+        "history_days": history_days,
+        "forecast_at": pd.Timestamp(now),
+    })
+    return df[forecast_columns]
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,256 @@
+import datetime as dt
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing
+from dataclasses import dataclass, field
+import sqlite3
+
+import sqlalchemy as sa
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+source_db = "wcmkt.db"
+derived_db = "derived.db"
+
+# source tables small enough to hash in full on every run; a stage reading any
+# other source table (marketorders, market_history) has no exact change signal
+# and always runs
+hashed_tables = ("marketstats", "doctrines", "ship_targets", "lead_ships")
+
+metadata = sa.MetaData()
+
+stage_fingerprints_table = sa.Table(
+    "pipeline_fingerprints",
+    metadata,
+    sa.Column("stage", sa.String, primary_key=True),
+    sa.Column("fingerprint", sa.String, nullable=False),
+    sa.Column("updated_at", sa.String, nullable=False),
+)
+
+stage_runs_table = sa.Table(
+    "pipeline_runs",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+    sa.Column("run_started_at", sa.String, nullable=False),
+    sa.Column("stage", sa.String, nullable=False),
+    sa.Column("status", sa.String, nullable=False),
+    sa.Column("duration", sa.Float),
+    sa.Column("error", sa.String),
+)
+
+
+@dataclass
+class Stage:
+    """A post-sync step. inputs are source tables or outputs of other stages."""
+    name: str
+    func: callable
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+
+
+@dataclass
+class StageResult:
+    stage: str
+    status: str  # "ran", "skipped", "failed" or "blocked"
+    duration: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class PipelineContext:
+    """What a stage gets to work with: the synced replica (read only) and the derived database."""
+    source_db: str
+    source_engine: sa.Engine
+    derived_engine: sa.Engine
+    run_started_at: dt.datetime
+    results: dict[str, StageResult] = field(default_factory=dict)
+
+
+def table_fingerprint(conn: sqlite3.Connection, table: str, chunk_size: int = 10000) -> str:
+    """Hash of a table's contents, used to tell whether a stage's inputs changed."""
+    digest = hashlib.md5()
+    cursor = conn.execute(f'SELECT * FROM "{table}" ORDER BY rowid')
+    while rows := cursor.fetchmany(chunk_size):
+        digest.update(repr(rows).encode())
+    return digest.hexdigest()
+
+
+def replace_table(engine: sa.Engine, table: str, df, dtype: dict | None = None, indexes: tuple[str, ...] = ()):
+    """Swap in df as table in one transaction, so readers see the old or the new rows, never neither."""
+    staging = f"{table}_new"
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{staging}"')
+        df.to_sql(staging, conn, index=False, dtype=dtype)
+        conn.exec_driver_sql(f'DROP TABLE IF EXISTS "{table}"')
+        conn.exec_driver_sql(f'ALTER TABLE "{staging}" RENAME TO "{table}"')
+        for column in indexes:
+            conn.exec_driver_sql(f'CREATE INDEX "ix_{table}_{column}" ON "{table}" ("{column}")')
+
+
+class SyncPipeline:
+    """Stages that build derived data after each sync.
+
+    Stages run on a worker pool as soon as the stages producing their inputs
+    have finished. A stage is skipped when all its source tables are in
+    hashed_tables, none of them changed since it last succeeded and no
+    upstream stage ran. Derived data is written
+    to derived.db, never to the synced replica.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.stages: dict[str, Stage] = {}
+
+    def stage(self, name: str, inputs: tuple[str, ...] = (), outputs: tuple[str, ...] = ()):
+        """Decorator registering func(context) as a stage."""
+        def register(func):
+            if name in self.stages:
+                raise ValueError(f"Stage {name} is already registered")
+            self.stages[name] = Stage(name, func, tuple(inputs), tuple(outputs))
+            return func
+        return register
+
+    def producers(self) -> dict[str, str]:
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"{output} is produced by both {producers[output]} and {stage.name}")
+                producers[output] = stage.name
+        return producers
+
+    def dependencies(self) -> dict[str, set[str]]:
+        producers = self.producers()
+        return {
+            stage.name: {producers[i] for i in stage.inputs if i in producers}
+            for stage in self.stages.values()
+        }
+
+    def order(self) -> list[str]:
+        """Stage names in dependency order; raises ValueError on cycles."""
+        dependencies = self.dependencies()
+        ordered = []
+        done = set()
+        while len(ordered) < len(dependencies):
+            ready = sorted(name for name, deps in dependencies.items() if name not in done and deps <= done)
+            if not ready:
+                raise ValueError(f"Pipeline has a dependency cycle among {sorted(set(dependencies) - done)}")
+            ordered.extend(ready)
+            done.update(ready)
+        return ordered
+
+    def _source_fingerprints(self, db_path: str) -> dict[str, str]:
+        producers = self.producers()
+        tables = sorted({i for stage in self.stages.values() for i in stage.inputs if i not in producers})
+        fingerprints = {}
+        with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)) as conn:
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in tables:
+                if table not in existing:
+                    fingerprints[table] = "missing"
+                elif table in hashed_tables:
+                    fingerprints[table] = table_fingerprint(conn, table)
+                else:
+                    fingerprints[table] = None
+        return fingerprints
+
+    def _stage_fingerprint(self, stage: Stage, source_fingerprints: dict[str, str | None]) -> str | None:
+        """Hash of the stage's source table fingerprints, or None if any of them is unknown."""
+        sources = [table for table in stage.inputs if table in source_fingerprints]
+        if any(source_fingerprints[table] is None for table in sources):
+            return None
+        parts = [f"{table}={source_fingerprints[table]}" for table in sources]
+        return hashlib.md5(";".join(parts).encode()).hexdigest()
+
+    def run(self, db_path: str = source_db, derived_path: str = derived_db, force: bool = False) -> dict[str, StageResult]:
+        """Run every stage whose inputs changed; returns the result per stage."""
+        run_started_at = dt.datetime.now(dt.UTC)
+        dependencies = self.dependencies()
+        self.order()  # fail early on cycles
+
+        derived_engine = sa.create_engine(f"sqlite:///{derived_path}")
+        metadata.create_all(derived_engine)
+        context = PipelineContext(db_path, sa.create_engine(f"sqlite:///file:{db_path}?mode=ro&uri=true"), derived_engine, run_started_at)
+
+        source_fingerprints = self._source_fingerprints(db_path)
+        with derived_engine.connect() as conn:
+            previous = dict(conn.execute(sa.select(stage_fingerprints_table.c.stage, stage_fingerprints_table.c.fingerprint)).all())
+        fingerprints = {name: self._stage_fingerprint(stage, source_fingerprints) for name, stage in self.stages.items()}
+
+        results = context.results
+        pending = dict(dependencies)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sync_pipeline") as executor:
+            while pending or running:
+                for name in sorted(pending):
+                    deps = pending[name]
+                    if not deps <= results.keys():
+                        continue
+                    del pending[name]
+                    upstream = [results[d].status for d in deps]
+                    if any(status in ("failed", "blocked") for status in upstream):
+                        results[name] = StageResult(name, "blocked", error="upstream stage failed")
+                    elif not force and "ran" not in upstream and fingerprints[name] is not None and previous.get(name) == fingerprints[name]:
+                        results[name] = StageResult(name, "skipped")
+                    else:
+                        running[executor.submit(self._run_stage, self.stages[name], context)] = name
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    results[name] = future.result()
+
+        self._record(derived_engine, run_started_at, results, fingerprints)
+        context.source_engine.dispose()
+        derived_engine.dispose()
+        summary = ", ".join(f"{r.stage}={r.status} ({r.duration:.2f}s)" for r in results.values())
+        logger.info(f"Sync pipeline finished in {(dt.datetime.now(dt.UTC) - run_started_at).total_seconds():.2f}s: {summary}")
+        return results
+
+    def _run_stage(self, stage: Stage, context: PipelineContext) -> StageResult:
+        start = time.perf_counter()
+        try:
+            stage.func(context)
+        except Exception as e:
+            logger.error(f"Pipeline stage {stage.name} failed: {e}")
+            return StageResult(stage.name, "failed", time.perf_counter() - start, str(e))
+        return StageResult(stage.name, "ran", time.perf_counter() - start)
+
+    def _record(self, engine: sa.Engine, run_started_at: dt.datetime, results: dict[str, StageResult], fingerprints: dict[str, str]):
+        now = dt.datetime.now(dt.UTC).isoformat()
+        with engine.begin() as conn:
+            conn.execute(sa.insert(stage_runs_table), [
+                {"run_started_at": run_started_at.isoformat(), "stage": r.stage, "status": r.status, "duration": r.duration, "error": r.error}
+                for r in results.values()
+            ])
+            ran = [name for name, r in results.items() if r.status == "ran" and fingerprints[name] is not None]
+            for name in ran:
+                stmt = sa.insert(stage_fingerprints_table).prefix_with("OR REPLACE").values(stage=name, fingerprint=fingerprints[name], updated_at=now)
+                conn.execute(stmt)
+
+
+def load_stage_runs(derived_path: str = derived_db, limit: int = 500) -> list[dict]:
+    """Most recent stage results, newest first (empty before the first pipeline run)."""
+    if not os.path.exists(derived_path):
+        return []
+    engine = sa.create_engine(f"sqlite:///{derived_path}")
+    try:
+        with engine.connect() as conn:
+            stmt = sa.select(stage_runs_table).order_by(stage_runs_table.c.id.desc()).limit(limit)
+            return [dict(row) for row in conn.execute(stmt).mappings()]
+    except sa.exc.OperationalError:
+        return []
+    finally:
+        engine.dispose()
+
+
+pipeline = SyncPipeline()
+
+
+if __name__ == "__main__":
+    pass
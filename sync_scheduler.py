@@ -1,85 +1,208 @@
+import bisect
 import datetime as dt
-import json
-import os
-import time
+import fcntl
+import random
 import threading
-import streamlit as st
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
+
 from logging_config import setup_logging
+from sync_state import sync_state
 
 
 logger = setup_logging(__name__)
 
-sync_file = "last_sync_state.json"
-
-with open(sync_file, "r") as f:
-    saved_sync_state = json.load(f)
+lock_file = "sync.lock"
+time_format = "%Y-%m-%d %H:%M %Z"
 
-last_saved_sync = dt.datetime.strptime(saved_sync_state['last_sync'], "%Y-%m-%d %H:%M %Z").replace(tzinfo=dt.UTC)
-next_saved_sync = dt.datetime.strptime(saved_sync_state['next_sync'], "%Y-%m-%d %H:%M %Z").replace(tzinfo=dt.UTC)
 
+@lru_cache(maxsize=8)
+def parse_sync_times(sync_times: tuple[str, ...]) -> list[int]:
+    """Sorted minutes after midnight (UTC) for "HH:MM" sync times."""
+    minutes = set()
+    for time_str in sync_times:
+        hour, minute = map(int, time_str.split(':'))
+        minutes.add(hour * 60 + minute)
+    return sorted(minutes)
 
-def initialize_sync_state():
-    if 'sync_status' not in st.session_state:
-        st.session_state.sync_status = "Not yet run"
-    if st.session_state.get('last_sync') is None:
-        st.session_state['last_sync'] = last_saved_sync
-    if st.session_state.get('next_sync') is None:
-        st.session_state['next_sync'] = next_saved_sync
 
-#cache for 15 minutes
-@st.cache_data(ttl=900)
-def check_sync_status():
-    """Check if a sync is needed based on the next scheduled sync time"""
+def schedule_next_sync(last_sync: dt.datetime, sync_times: list[str] | None = None) -> dt.datetime:
+    """The first scheduled sync time after now."""
     now = dt.datetime.now(dt.UTC)
-    
-    # If we don't have a last sync time, we should sync
-    if not st.session_state.get('last_sync'):
-        return True
-        
-    # If we've passed the next sync time, we should sync
-    if now >= st.session_state.next_sync:
-        return True
-        
-    # If we're within 1 minute of the next sync time, we should sync
-    time_to_next = st.session_state.next_sync - now
-    if time_to_next.total_seconds() <= 60:
-        return True
-    
-    return False
+    if sync_times is None:
+        sync_times = sync_state.load()['sync_times']
+    minutes = parse_sync_times(tuple(sync_times))
 
-def schedule_next_sync(last_sync: dt.datetime) -> dt.datetime:
-    """Schedule the next sync based on the sync times in last_sync_state.json"""
-    now = dt.datetime.now(dt.UTC)
-    sync_times = saved_sync_state['sync_times']
-    
-    # Convert sync times to today's datetime objects
-    today_sync_times = []
-    for time_str in sync_times:
-        hour, minute = map(int, time_str.split(':'))
-        sync_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        
-        # If the time is earlier in the day and we've passed it, schedule it for tomorrow
-        if sync_time < now:
-            sync_time += dt.timedelta(days=1)
-            
-        today_sync_times.append(sync_time)
-    
-    # Sort sync times
-    today_sync_times.sort()
-    
-    # Find the next sync time
-    for sync_time in today_sync_times:
-        if sync_time > now:
-            logger.info(f"Next sync time: {sync_time}, timezone: {sync_time.tzname()}")
-            return sync_time
-            
-    # If no sync times are left today, get the first time for tomorrow
-    if today_sync_times:
-        logger.info(f"No sync times left for today. Next sync time: {today_sync_times[0]}, timezone: {today_sync_times[0].tzname()}")
-        return today_sync_times[0]
-    
     # Fallback: if no sync times defined, schedule for 3 hours from now
-    return now + dt.timedelta(hours=3)
+    if not minutes:
+        return now + dt.timedelta(hours=3)
+
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    now_minute = now.hour * 60 + now.minute
+    i = bisect.bisect_right(minutes, now_minute)
+    if i < len(minutes):
+        next_sync = midnight + dt.timedelta(minutes=minutes[i])
+    else:
+        next_sync = midnight + dt.timedelta(days=1, minutes=minutes[0])
+    logger.info(f"Next sync time: {next_sync}, timezone: {next_sync.tzname()}")
+    return next_sync
+
+
+@dataclass(frozen=True)
+class SyncStatus:
+    last_sync: dt.datetime | None = None
+    next_sync: dt.datetime | None = None
+    generation: int = 0
+    duration: float | None = None
+    status: str = "Not yet run"
+    in_progress: bool = False
+    failures: int = 0
+    retry_at: dt.datetime | None = None
+
+
+class SyncScheduler:
+    """One database sync schedule per host.
+
+    A daemon thread in each process wakes up at the scheduled times (plus
+    jitter); an exclusive file lock makes sure only one process runs the sync,
+    and the others pick up the new state afterwards. Failed syncs are retried
+    with exponential backoff. Sessions only read the shared status record.
+    A follower never syncs; it only picks up syncs made by other processes.
+    """
+
+    def __init__(self, sync_func, on_external_sync=None, on_sync=None, jitter: float = 60, base_backoff: float = 60, max_backoff: float = 3600, poll_interval: float = 60, follower: bool = False):
+        self.sync_func = sync_func
+        self.on_external_sync = on_external_sync
+        self.on_sync = on_sync
+        self.follower = follower
+        self.jitter = jitter
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self._status = SyncStatus()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._jitter = random.uniform(0, jitter)
+
+    def status(self) -> SyncStatus:
+        return self._status
+
+    def _update(self, **changes):
+        self._status = replace(self._status, **changes)
+
+    def _load(self):
+        """Adopt the persisted state, which another process may have updated."""
+        try:
+            state = sync_state.load()
+        except Exception as e:
+            logger.error(f"Error reading sync state: {e}")
+            return
+        last_sync = state.get("last_sync")
+        if self._thread is not None and state["generation"] > self._status.generation and not self._status.in_progress:
+            logger.info(f"Database synced by another process at {last_sync}")
+            self._update(status="Success", failures=0, retry_at=None)
+            if self.on_external_sync:
+                self.on_external_sync()
+        next_sync = state.get("next_sync")
+        if self._status.next_sync is not None and (next_sync is None or self._status.next_sync > next_sync):
+            # a skipped sync moves the schedule on without persisting it
+            next_sync = self._status.next_sync
+        self._update(last_sync=last_sync, next_sync=next_sync, generation=state["generation"], duration=state["duration"])
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._load()
+                self._thread = threading.Thread(target=self._run, name="sync_scheduler", daemon=True)
+                self._thread.start()
+        return self
+
+    def due_at(self) -> dt.datetime | None:
+        status = self._status
+        if status.retry_at is not None:
+            return status.retry_at
+        if status.next_sync is None:
+            return None
+        return status.next_sync + dt.timedelta(seconds=self._jitter)
+
+    def _run(self):
+        while True:
+            self._load()
+            if self.follower:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            now = dt.datetime.now(dt.UTC)
+            due = self.due_at()
+            if due is None or due <= now:
+                if self.run_once():
+                    continue
+                # another thread or process may hold the sync; check back later rather than spinning
+                now = dt.datetime.now(dt.UTC)
+                due = self.due_at()
+            if due is None or due <= now:
+                wait = self.poll_interval
+            else:
+                wait = min((due - now).total_seconds(), self.poll_interval)
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def run_once(self, force: bool = False) -> bool:
+        """Sync unless another thread or process is already syncing; returns True if this call synced."""
+        if self.follower or not self._lock.acquire(blocking=False):
+            return False
+        try:
+            with open(lock_file, "w") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.info("Sync already running in another process")
+                    return False
+                try:
+                    return self._sync(force)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+
+    def _sync(self, force: bool) -> bool:
+        scheduled = self._status.retry_at or self._status.next_sync
+        self._load()
+        # another process may have synced while we waited for the lock
+        if not force and self._status.retry_at is None and self._status.next_sync != scheduled:
+            return False
+
+        self._update(in_progress=True, status="Syncing")
+        sync_start = time.monotonic()
+        try:
+            synced = self.sync_func()
+        except Exception as e:
+            failures = self._status.failures + 1
+            backoff = min(self.base_backoff * 2 ** (failures - 1), self.max_backoff)
+            retry_at = dt.datetime.now(dt.UTC) + dt.timedelta(seconds=backoff)
+            logger.error(f"Sync failed ({failures} in a row), retrying at {retry_at}: {e}")
+            self._update(in_progress=False, status=f"Failed: {e}", failures=failures, retry_at=retry_at)
+            return False
+
+        self._jitter = random.uniform(0, self.jitter)
+        now = dt.datetime.now(dt.UTC)
+        next_sync = schedule_next_sync(now)
+        if synced is False:
+            # nothing to sync (e.g. a local database); wait for the next slot without recording a sync
+            self._update(in_progress=False, status="Skipped", next_sync=next_sync, failures=0, retry_at=None)
+            return False
+
+        duration = time.monotonic() - sync_start
+        generation = sync_state.record_sync(now, next_sync, duration)
+        if self.on_sync:
+            # before the new generation is visible, so nothing cached from the
+            # old data (e.g. during the sync) gets keyed to the new generation
+            self.on_sync()
+        self._update(in_progress=False, status="Success", last_sync=now, next_sync=next_sync, generation=generation, duration=duration, failures=0, retry_at=None)
+        logger.info(f"Sync state updated, last sync: {now.strftime(time_format)}, next sync: {next_sync.strftime(time_format)}")
+        return True
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,165 @@
+import datetime as dt
+import json
+import os
+import threading
+
+import sqlalchemy as sa
+
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+sync_state_url = "sqlite:///sync_state.db"
+legacy_sync_file = "last_sync_state.json"
+legacy_time_format = "%Y-%m-%d %H:%M %Z"
+default_sync_times = ["13:00", "16:00", "19:00", "22:00", "1:00", "4:00", "7:00", "10:00"]
+
+metadata = sa.MetaData()
+
+sync_state_table = sa.Table(
+    "sync_state",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("last_sync", sa.String),
+    sa.Column("next_sync", sa.String),
+    sa.Column("sync_times", sa.String, nullable=False),
+    sa.Column("duration", sa.Float),
+    sa.Column("generation", sa.Integer, nullable=False, default=0),
+    sa.CheckConstraint("id = 1", name="single_row"),
+)
+
+
+sync_ledger_table = sa.Table(
+    "sync_ledger",
+    metadata,
+    sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+    sa.Column("started_at", sa.String, nullable=False),
+    sa.Column("ended_at", sa.String),
+    sa.Column("duration", sa.Float),
+    sa.Column("status", sa.String, nullable=False),
+    sa.Column("error", sa.String),
+    sa.Column("size_before", sa.Integer),
+    sa.Column("size_after", sa.Integer),
+    sa.Column("size_delta", sa.Integer),
+    sa.Column("row_deltas", sa.String),
+    sa.Column("warmup_duration", sa.Float),
+)
+
+
+def _to_datetime(value: str | None) -> dt.datetime | None:
+    return dt.datetime.fromisoformat(value) if value else None
+
+
+def _to_text(value: dt.datetime | None) -> str | None:
+    return value.astimezone(dt.UTC).isoformat() if value else None
+
+
+class SyncStateStore:
+    """Database sync state kept as a single row in a local SQLite file, plus a ledger of sync runs.
+
+    Every read is one primary key lookup and every write is one transaction,
+    so concurrent workers never see a partly written state. Nothing is opened
+    until first use; the row is seeded from last_sync_state.json if present.
+    """
+
+    def __init__(self, db_url: str = sync_state_url, legacy_file: str = legacy_sync_file):
+        self.db_url = db_url
+        self.legacy_file = legacy_file
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> sa.Engine:
+        with self._lock:
+            if self._engine is None:
+                engine = sa.create_engine(self.db_url)
+                metadata.create_all(engine)
+                with engine.begin() as conn:
+                    conn.execute(sa.insert(sync_state_table).prefix_with("OR IGNORE").values(**self._seed()))
+                self._engine = engine
+        return self._engine
+
+    def _seed(self) -> dict:
+        row = {"id": 1, "sync_times": json.dumps(default_sync_times), "generation": 0}
+        if not os.path.exists(self.legacy_file):
+            return row
+        try:
+            with open(self.legacy_file, "r") as f:
+                legacy = json.load(f)
+            for key in ("last_sync", "next_sync"):
+                if legacy.get(key):
+                    row[key] = _to_text(dt.datetime.strptime(legacy[key], legacy_time_format).replace(tzinfo=dt.UTC))
+            if legacy.get("sync_times"):
+                row["sync_times"] = json.dumps(legacy["sync_times"])
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading {self.legacy_file}, using defaults: {e}")
+        return row
+
+    def load(self) -> dict:
+        """Current state: last_sync/next_sync as datetimes, sync_times, duration, generation."""
+        with self.engine.connect() as conn:
+            row = conn.execute(sa.select(sync_state_table).where(sync_state_table.c.id == 1)).mappings().one()
+        return {
+            "last_sync": _to_datetime(row["last_sync"]),
+            "next_sync": _to_datetime(row["next_sync"]),
+            "sync_times": json.loads(row["sync_times"]),
+            "duration": row["duration"],
+            "generation": row["generation"],
+        }
+
+    def record_sync(self, last_sync: dt.datetime, next_sync: dt.datetime, duration: float) -> int:
+        """Record a completed sync and return the new generation."""
+        stmt = (
+            sa.update(sync_state_table)
+            .where(sync_state_table.c.id == 1)
+            .values(
+                last_sync=_to_text(last_sync),
+                next_sync=_to_text(next_sync),
+                duration=duration,
+                generation=sync_state_table.c.generation + 1,
+            )
+            .returning(sync_state_table.c.generation)
+        )
+        with self.engine.begin() as conn:
+            return conn.execute(stmt).scalar_one()
+
+    def record_run(self, started_at: dt.datetime, ended_at: dt.datetime, status: str, error: str | None = None, size_before: int | None = None, size_after: int | None = None, row_deltas: dict[str, int] | None = None, warmup_duration: float | None = None):
+        """Append one sync attempt to the ledger."""
+        size_delta = size_after - size_before if size_before is not None and size_after is not None else None
+        stmt = sa.insert(sync_ledger_table).values(
+            started_at=_to_text(started_at),
+            ended_at=_to_text(ended_at),
+            duration=(ended_at - started_at).total_seconds(),
+            status=status,
+            error=error,
+            size_before=size_before,
+            size_after=size_after,
+            size_delta=size_delta,
+            row_deltas=json.dumps(row_deltas) if row_deltas is not None else None,
+            warmup_duration=warmup_duration,
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def load_ledger(self, limit: int = 500) -> list[dict]:
+        """Most recent ledger rows, newest first."""
+        stmt = sa.select(sync_ledger_table).order_by(sync_ledger_table.c.id.desc()).limit(limit)
+        with self.engine.connect() as conn:
+            rows = conn.execute(stmt).mappings().all()
+        return [
+            {**row, "started_at": _to_datetime(row["started_at"]), "ended_at": _to_datetime(row["ended_at"]),
+             "row_deltas": json.loads(row["row_deltas"]) if row["row_deltas"] else {}}
+            for row in rows
+        ]
+
+    def set_sync_times(self, sync_times: list[str]):
+        stmt = sa.update(sync_state_table).where(sync_state_table.c.id == 1).values(sync_times=json.dumps(sync_times))
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+
+sync_state = SyncStateStore()
+
+
+if __name__ == "__main__":
+    print(sync_state.load())
@@ -0,0 +1,26 @@
+import os
+import threading
+
+os.environ.setdefault("WCMKT_DEPLOY_MODE", "syncer")
+
+import snapshots
+from db_utils import get_sync_scheduler
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+
+def main():
+    """Run the sync schedule and publish snapshots for app workers (WCMKT_DEPLOY_MODE=worker)."""
+    if snapshots.deploy_mode != "syncer":
+        raise SystemExit(f"syncer.py needs WCMKT_DEPLOY_MODE=syncer, not {snapshots.deploy_mode}")
+    if snapshots.snapshots.current() is None and os.path.exists(snapshots.market_db):
+        # give workers something to read before the first scheduled sync
+        snapshots.snapshots.publish()
+    get_sync_scheduler()
+    logger.info(f"Syncer started, publishing snapshots to {snapshots.snapshot_dir}")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
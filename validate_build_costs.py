@@ -0,0 +1,88 @@
+import argparse
+import datetime
+import json
+import pathlib
+
+from build_cost_calculator import get_local_costs, validate_against_everef
+from build_cost_catalog import load_catalog
+from build_sheet import fetch_structure_costs
+from industry_index import industry_index
+from logging_config import setup_logging
+
+logger = setup_logging(__name__)
+
+fixtures_dir = "everef_fixtures"
+
+
+def fixture_path(directory: str, type_id: int, runs: int, me: int, te: int, security: str) -> pathlib.Path:
+    return pathlib.Path(directory) / f"{type_id}_{runs}_{me}_{te}_{security}.json"
+
+
+def record_fixture(type_id: int, runs: int, me: int, te: int, security: str = "NULL_SEC", directory: str = fixtures_dir) -> pathlib.Path:
+    """Query everef for every structure in the catalog and save the responses as a fixture."""
+    industry_index.refresh()
+    catalog = load_catalog(industry_index.index_version() or "uncached")
+    results = fetch_structure_costs(type_id, runs, me, te, catalog, catalog.structures, security)
+    if not results:
+        raise SystemExit(f"everef returned no costs for {type_id}")
+
+    path = fixture_path(directory, type_id, runs, me, te, security)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fixture = {
+        "type_id": type_id,
+        "runs": runs,
+        "me": me,
+        "te": te,
+        "security": security,
+        "index_version": catalog.index_version,
+        "recorded_at": datetime.datetime.now().astimezone(datetime.UTC).isoformat(),
+        "results": results,
+    }
+    path.write_text(json.dumps(fixture, indent=2))
+    logger.info(f"Recorded everef costs for {type_id} at {len(results)} structures to {path}")
+    return path
+
+
+def check_fixtures(directory: str = fixtures_dir, tolerance: float = 0.01) -> bool:
+    """Compare the local cost engine with every recorded fixture; returns True if all are within tolerance.
+
+    The local engine uses the structures, indexes and prices stored now, so
+    fixtures should be re-recorded after those change.
+    """
+    paths = sorted(pathlib.Path(directory).glob("*.json"))
+    if not paths:
+        raise SystemExit(f"No fixtures in {directory}; record some with --record")
+
+    catalog = load_catalog(industry_index.index_version() or "uncached")
+    passed = True
+    for path in paths:
+        fixture = json.loads(path.read_text())
+        local = get_local_costs(fixture["type_id"], fixture["runs"], fixture["me"], fixture["security"], structures=catalog.structure_frame())
+        errors = validate_against_everef(local, fixture["results"], tolerance)
+        max_error = errors.to_numpy().max() if not errors.empty else 0.0
+        ok = not errors.empty and max_error <= tolerance
+        passed &= ok
+        print(f"{'ok  ' if ok else 'FAIL'} {path.name}: {len(errors)} structures, max error {max_error:.2%}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the local build cost engine against recorded everef responses")
+    parser.add_argument("--record", type=int, metavar="TYPE_ID", help="record everef costs for this product instead of checking")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--me", type=int, default=10)
+    parser.add_argument("--te", type=int, default=10)
+    parser.add_argument("--security", choices=["HIGH_SEC", "LOW_SEC", "NULL_SEC"], default="NULL_SEC")
+    parser.add_argument("--fixtures", default=fixtures_dir, help=f"fixture directory (default: {fixtures_dir})")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="largest relative error allowed per field")
+    args = parser.parse_args()
+
+    if args.record is not None:
+        record_fixture(args.record, args.runs, args.me, args.te, args.security, args.fixtures)
+        return
+    if not check_fixtures(args.fixtures, args.tolerance):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()